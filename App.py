@@ -1,356 +1,226 @@
-from flask import Flask, render_template_string , request, render_template, redirect, url_for
-import pandas as pd
-import requests
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from flask import Flask, Response, request, render_template, stream_template, redirect, url_for
+from flask import before_render_template, template_rendered
 import os
 import json
-from gspread.utils import rowcol_to_a1
+import logging
+import threading
+import time
+import click
+from sheets_client import SheetsClientManager
+from storage import AlreadyExists, GoogleSheetsStorage, NotFound, SQLiteStorage, make_storage
+from snapshot import build_snapshot, with_matchups
+from snapshot_store import SnapshotStore
+from data_cache import SnapshotCache
+from optimizer import MODES, optimize_sideboard, result_key
+from result_cache import ResultCache
+from jobs import JobQueue, JobQueueFull
+from match_queue import MatchQueue, apply_deltas, match_counters
+from tables import table_page
+import metrics
+from profiling import RequestProfiler
 
 app = Flask(__name__)
 
-def update_data():
-    global matchup_data_file_path, effectiveness_scores_file_path
-    global matchup_data_df, effectiveness_scores_df
-    global effectiveness_scores, max_card_copies
-    global matchup_data, total_games_played
-
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    #creds = ServiceAccountCredentials.from_json_keyfile_name("google_sheets_credentials.json", scope)
-    google_creds_json = os.getenv("GOOGLE_SHEETS_CREDENTIALS")
-    if google_creds_json:
-        google_creds_dict = json.loads(google_creds_json)
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(google_creds_dict)
-    else:
-        raise ValueError("Google Sheets credentials not found in environment variables.")
-    client = gspread.authorize(creds)
-
-    matchup_data_file_path = client.open("Matchup_Data_Cloud")
-    sheet1 = matchup_data_file_path.sheet1
-    effectiveness_scores_file_path = client.open("Effectiveness_Scores_Cloud")
-    sheet2 = effectiveness_scores_file_path.sheet1
-
-    matchup_data_df = pd.DataFrame(sheet1.get_all_records())
-    effectiveness_scores_df = pd.DataFrame(sheet2.get_all_records())
-
-    effectiveness_scores = {}
-    max_card_copies = {}
-
-    for _, row in effectiveness_scores_df.iterrows():
-        card_name = row.iloc[0]  # Assuming first column is the card name
-        effectiveness_scores[card_name] = row.iloc[1:].to_dict()
-        max_card_copies[card_name] = int(row["Max Copies"]) if "Max Copies" in row and not pd.isna(row["Max Copies"]) else 4
-
-    # === Bayesian Adjustments for Play Rate & Win Rate ===
-    matchup_data = {}
-    total_games_played = matchup_data_df["# of times fought"].sum()
-    total_matchups = len(matchup_data_df)
-
-    for _, row in matchup_data_df.iterrows():
-        deck_name = row["Deck"]
-        recorded_playrate = row["# of times fought"] / total_games_played
-        expected_playrate = row["MTGO PR"]
-        times_fought = max(1, row["# of times fought"])  # Prevent dividing by 0
-        max_slots = row["Max Slots"]
-        recorded_winrate = row["# of match wins"] / times_fought
-
-        # Bayesian adjustment using an inversely proportional K factor
-        adjusted_playrate = ((times_fought) + (expected_playrate * (total_matchups / total_games_played))) / (total_games_played + (total_matchups / total_games_played))
-        adjusted_winrate = ((recorded_winrate) * (times_fought) + (0.5 * (100 / times_fought))) / ((100 / times_fought) + times_fought)
-
-        matchup_data[deck_name] = {
-            "adjusted_playrate": adjusted_playrate,
-            "adjusted_winrate": adjusted_winrate,
-            "max_slots": max_slots
-        }
-
-
-
-def assign_sideboard_cards(remaining_slots):
-    sideboard_map = {}
-    # A=2B based on expected sideboard effectiveness on tournament winrate
-    A = 2/3
-    B = 1/3 
-
-    sorted_decks = sorted(
-        matchup_data.items(),
-        key=lambda x: (x[1]["adjusted_playrate"] * A) + ((0.50 - x[1]["adjusted_winrate"]) * B),
-        reverse=True  # Higher priority scores first
+# Pages live in templates/; compile them all once up front and let
+# render_template reuse the compiled versions from the Jinja cache
+for template_name in app.jinja_env.list_templates():
+    app.jinja_env.get_template(template_name)
+
+# One authorized client and set of worksheet handles per worker process
+sheets = SheetsClientManager(timeout=float(os.getenv("SHEETS_FETCH_TIMEOUT", "20")))
+
+# Google Sheets by default; STORAGE_BACKEND=sqlite for a local database
+storage = make_storage(sheets)
+
+# Match results are queued locally and written to storage in batches
+match_queue = MatchQueue(
+    storage,
+    path=os.getenv("MATCH_QUEUE_PATH", "match_queue.db"),
+    flush_interval=float(os.getenv("MATCH_FLUSH_INTERVAL", "10")),
+    max_batch=int(os.getenv("MATCH_FLUSH_BATCH", "20")),
+)
+
+# Last good snapshot, shared by every worker through memory-mapped files on
+# disk; also served on a warm start and while storage is down
+snapshot_store = SnapshotStore(os.getenv("SNAPSHOT_DIR", "snapshot_cache"))
+
+def update_data(version=0):
+    # Workers take the shared snapshot while it's fresh. Once it's due a refresh,
+    # only the elected worker goes back to storage (any worker, if there is no
+    # background refresher); writes always do, so the writer sees its change.
+    # Either way, matches any worker queued since are added on top.
+    current = data_cache.peek()
+    if current is not None and not data_cache.is_invalidated():
+        published = snapshot_store.published()
+        due = published is None or time.time() - published["loaded_at"] >= (refresh_interval or data_cache.ttl)
+        if not due or not (refresh_interval == 0 or snapshot_store.elected()):
+            return load_saved_data(version) or fold_queued_matches(current, version)
+    return fetch_data(version)
+
+def fetch_data(version=0):
+    # Matches still in the queue aren't in storage yet, so add them on top. The
+    # queue lock keeps any worker's flush from landing between the two reads.
+    with match_queue.locked():
+        matchup_data_df, effectiveness_scores_df = storage.load_tables()
+        match_queue.settle(match_counters(matchup_data_df))
+        deltas, queued_through = match_queue.pending_deltas()
+    snapshot = build_snapshot(
+        apply_deltas(matchup_data_df, deltas), effectiveness_scores_df, version,
+        previous=data_cache.peek(), queued_through=queued_through
     )
+    try:
+        snapshot_store.save(snapshot)
+    except Exception:
+        logging.getLogger(__name__).exception("Couldn't save the data snapshot to %s", snapshot_store.directory)
+    return snapshot
+
+def load_saved_data(version=0):
+    # Saved snapshot, if this worker doesn't have it yet, plus whatever was
+    # queued after it was taken
+    snapshot = snapshot_store.load_newer(version)
+    if snapshot is None:
+        return None
+    return fold_queued_matches(snapshot, version)
+
+def fold_queued_matches(snapshot, version):
+    # Same snapshot plus any matches queued since it was built - no storage round trip
+    deltas, queued_through = match_queue.pending_deltas(after=snapshot.queued_through)
+    if not deltas:
+        return snapshot
+    return with_matchups(snapshot, apply_deltas(snapshot.matchup_data_df, deltas), version, queued_through)
+
+# Reads are served from this cache; write routes call data_cache.invalidate().
+# Data is refreshed from storage every DATA_REFRESH_INTERVAL seconds, and a
+# background thread checks for a newer shared snapshot every
+# SNAPSHOT_POLL_INTERVAL seconds (a refresh interval of 0 turns the thread off
+# and expired data is reloaded on the request path instead). Until the first
+# load succeeds, the snapshot saved on disk is served.
+refresh_interval = float(os.getenv("DATA_REFRESH_INTERVAL", os.getenv("DATA_CACHE_TTL", "60")))
+poll_interval = min(refresh_interval, float(os.getenv("SNAPSHOT_POLL_INTERVAL", "2")))
+data_cache = SnapshotCache(
+    update_data,
+    ttl=float(os.getenv("DATA_CACHE_TTL", "60")),
+    refresh_interval=poll_interval or None,
+    fallback=load_saved_data,
+)
+
+# Optimizer results keyed by snapshot content hash and parameters
+optimizer_results = ResultCache("optimizer_results", max_entries=int(os.getenv("OPTIMIZER_CACHE_SIZE", "64")))
+
+# Serialized /api/decks and /api/cards bodies keyed by table content hash
+api_bodies = ResultCache("api_bodies", max_entries=8)
+
+# Optimizer runs happen here rather than in the request, so an exact solve
+# can't tie up a worker past its timeout. /sideboard and /api/sideboard wait
+# up to request_wait seconds for the result before answering with the job
+# instead (a page that refreshes itself, or a 202); pollers may ask to wait
+# up to job_wait seconds.
+optimizer_jobs = JobQueue(max_workers=int(os.getenv("OPTIMIZER_JOB_WORKERS", "2")),
+                          max_pending=int(os.getenv("OPTIMIZER_JOB_QUEUE", "16")))
+request_wait = float(os.getenv("OPTIMIZER_REQUEST_WAIT", "1.5"))
+job_wait = float(os.getenv("OPTIMIZER_JOB_WAIT", "20"))
+
+
+@app.after_request
+def add_data_age(response):
+    # How old the served data is, in seconds since it was fetched from storage
+    age = data_cache.age()
+    if age is not None:
+        response.headers["X-Data-Age"] = str(int(age))
+    return response
+
+
+# Render time per template, from Flask's render signals. Streamed pages are
+# rendered as they're sent, so theirs includes the time spent sending.
+render_starts = threading.local()
+
+def start_render_timer(sender, template, **extra):
+    if not hasattr(render_starts, "stack"):
+        render_starts.stack = []
+    render_starts.stack.append(time.perf_counter())
+
+def stop_render_timer(sender, template, **extra):
+    stack = getattr(render_starts, "stack", None)
+    if stack:
+        metrics.observe("sideboard_render_seconds", time.perf_counter() - stack.pop(), template=template.name)
+
+if metrics.ENABLED:
+    before_render_template.connect(start_render_timer, app)
+    template_rendered.connect(stop_render_timer, app)
+
+
+# Opt-in profiling of single requests for admins holding PROFILE_TOKEN; see
+# profiling.py. Off unless the token is set.
+RequestProfiler(os.getenv("PROFILE_TOKEN"), os.getenv("PROFILE_DIR", "profiles")).install(app)
+
+
+@app.cli.command("import-sheets")
+def import_sheets():
+    # Seed the SQLite backend with a copy of the Google Sheets (replaces what's in it):
+    #   STORAGE_BACKEND=sqlite flask --app App import-sheets
+    if not isinstance(storage, SQLiteStorage):
+        raise click.ClickException("Set STORAGE_BACKEND=sqlite to import into the SQLite database.")
+    matchup_data_df, effectiveness_scores_df = GoogleSheetsStorage(sheets).load_tables()
+    # Not while a flush is writing to the tables being replaced
+    with match_queue.locked():
+        storage.import_tables(matchup_data_df, effectiveness_scores_df)
+    click.echo(f"Imported {len(matchup_data_df)} decks and {len(effectiveness_scores_df)} cards into {storage.path}.")
+
+
+def stream_page(template_name, **context):
+    # Jinja yields every tag and variable separately; send the page to the
+    # client in ~8 KB pieces instead of thousands of tiny writes
+    chunks = stream_template(template_name, **context)  # Needs the request context, so start it here
+
+    def batched():
+        buffer, size = [], 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= 8192:
+                yield "".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer)
+
+    return batched()
 
-    for deck_name, data in sorted_decks:
-        if remaining_slots <= 0:
-            break
-
-        sorted_cards = sorted(
-            effectiveness_scores.keys(),
-            key=lambda card: effectiveness_scores[card].get(deck_name, 0),
-            reverse=True
-        )
-
-        for card in sorted_cards:
-            if remaining_slots <= 0:
-                break
-
-            max_allowed = min(4, remaining_slots, max_card_copies.get(card, 4))
-            num_copies = min(max_allowed, data["max_slots"])
-
-            if num_copies > 0:
-                sideboard_map[card] = num_copies
-                remaining_slots -= num_copies
-
-    return sideboard_map
-
-def refine_sideboard(sideboard_map):
-    max_iterations = 100  # Failsafe to avoid infinite loops
-    penalty_tracker = {}
-    seen_sideboards = set()
-
-    for iteration in range(max_iterations):
-        previous_sideboard = sideboard_map.copy()
-        sideboard_tuple = tuple(sorted(sideboard_map.items()))
-
-        if sideboard_tuple in seen_sideboards:
-            break
-        seen_sideboards.add(sideboard_tuple)
-
-        removable_cards = {}  
-        boardable_per_matchup = {}
-        dead_cards = []
-
-        for deck, data in matchup_data.items():
-            boardable_per_matchup[deck] = sum(
-                sideboard_map.get(card, 0) for card in sideboard_map 
-                if effectiveness_scores[card].get(deck, 0) > 5
-            )
-            max_boardable = data["max_slots"]
-            
-            if boardable_per_matchup[deck] > max_boardable:
-                excess = boardable_per_matchup[deck] - max_boardable
-                removable_cards[deck] = sorted(
-                    (card for card in sideboard_map if effectiveness_scores[card].get(deck, 0) > 5),
-                    key=lambda c: effectiveness_scores[c][deck]
-                )[:max(1, excess // 3)]  # Slower removal to prevent over-trimming
-
-        # Identify dead cards (low impact across matchups)
-        for card in list(sideboard_map.keys()):
-            impacted_matchups = sum(1 for deck in matchup_data if effectiveness_scores[card].get(deck, 0) > 5)
-            if impacted_matchups <= 2:  # Remove cards that are only useful in <=2 matchups
-                dead_cards.append(card)
-        
-        for deck, cards in removable_cards.items():
-            for card in cards:
-                if card in sideboard_map and sideboard_map[card] > 0:
-                    sideboard_map[card] -= 1
-                    if sideboard_map[card] == 0:
-                        del sideboard_map[card]
-                    penalty_tracker[card] = penalty_tracker.get(card, 0) + 1
-
-        for card in dead_cards:
-            if card in sideboard_map:
-                del sideboard_map[card]
-
-        # Ensure sideboard refills after removals
-        remaining_slots = 15 - sum(sideboard_map.values())
-        if remaining_slots > 0:
-            additional_cards = sorted(
-                effectiveness_scores.keys(),
-                key=lambda c: (sum(effectiveness_scores[c].values()) - penalty_tracker.get(c, 0)) + sum(1 for deck in matchup_data if effectiveness_scores[c].get(deck, 0) > 5) * 3,
-                reverse=True
-            )
-
-            for card in additional_cards:
-                if remaining_slots <= 0:
-                    break
-                if card not in sideboard_map or sideboard_map[card] < max_card_copies[card]:
-                    sideboard_map[card] = sideboard_map.get(card, 0) + 1
-                    remaining_slots -= 1
-    
-    return sideboard_map
 
 @app.route("/")
 def home():
-    update_data()
-    html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>MTG Sideboard App</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        <style>
-            body {
-                background-color: #f8f9fa;
-                font-family: Arial, sans-serif;
-                text-align: center;
-                padding: 20px;
-            }
-            .container {
-                max-width: 500px;
-                margin: auto;
-                padding: 20px;
-                background: white;
-                border-radius: 10px;
-                box-shadow: 0px 4px 8px rgba(0, 0, 0, 0.2);
-            }
-            .btn {
-                width: 100%;
-                margin: 5px 0;
-            }
-            #back-button {
-                display: none;
-            }
-            #edit-options {
-                display: none;
-            }
-        </style>
-        <script>
-            function showEditOptions() {
-                document.getElementById('edit-options').style.display = 'block';
-                document.getElementById('back-button').style.display = 'block';
-                document.getElementById('main-options').style.display = 'none';
-            }
-            function goBack() {
-                document.getElementById('edit-options').style.display = 'none';
-                document.getElementById('back-button').style.display = 'none';
-                document.getElementById('main-options').style.display = 'block';
-            }
-        </script>
-    </head>
-    <body>
-        <div class="container">
-            <h1 class="mb-3">MTG Sideboard App</h1>
-            <p class="text-muted">Choose an option:</p>
-
-            <div id="main-options">
-                <button class="btn btn-primary" onclick="location.href='/sideboard'">Run Sideboard Optimizer</button>
-                <button class="btn btn-secondary" onclick="showEditOptions()">Edit Data</button>
-            </div>
-
-            <!-- Back Button -->
-            <button id="back-button" class="btn btn-danger" onclick="goBack()">Back</button>
-
-            <div id="edit-options">
-                <h2 class="mt-3">Edit Data</h2>
-                <button class="btn btn-outline-primary" onclick="location.href='/add_card'">Add Card</button>
-                <button class="btn btn-outline-primary" onclick="location.href='/add_deck'">Add Deck</button>
-                <button class="btn btn-outline-primary" onclick="location.href='/add_match'">Add Match Record</button>
-                <button class="btn btn-outline-danger" onclick="location.href='/remove_deck'">Remove Deck</button>
-                <button class="btn btn-outline-danger" onclick="location.href='/remove_card'">Remove Card</button>
-                <button class="btn btn-outline-info" onclick="location.href='/view_decks'">View Decks</button>
-                <button class="btn btn-outline-info" onclick="location.href='/view_cards'">View Cards</button>
-            </div>
-        </div>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
-    """
-    return render_template_string(html)
+    return render_template("home.html")
 
 @app.route("/add_card", methods=["GET", "POST"])
 def add_card():
-    global effectiveness_scores_file_path  # This is still your Google Sheet object
-
-    # Read data from Google Sheets to get deck names
-    update_data()
-    deck_names = list(effectiveness_scores_df.columns[2:])  # Ignore first two columns
+    # Deck names come from the cached snapshot
+    data = data_cache.get()
+    deck_names = list(data.effectiveness_scores_df.columns[2:])  # Ignore first two columns
 
     if request.method == "POST":
         card_name = request.form.get("card_name")
         max_copies = int(request.form.get("max_copies"))
 
         # Get effectiveness scores from the form
-        effectiveness_values = []
+        effectiveness_values = {}
         for deck in deck_names:
-            value = int(request.form.get(f"effectiveness[{deck}]"))
-            effectiveness_values.append(value)
+            effectiveness_values[deck] = int(request.form.get(f"effectiveness[{deck}]"))
 
-        # Append new row to Google Sheet
-        new_row = [card_name, max_copies] + effectiveness_values
-        sheet = effectiveness_scores_file_path.sheet1  # Get the first sheet
-        sheet.append_row(new_row, value_input_option="USER_ENTERED")
+        try:
+            storage.add_card(card_name, max_copies, effectiveness_values)
+        except AlreadyExists as e:
+            return f"<h1>Error</h1><p>{e}</p>"
+        data_cache.invalidate()
 
         return redirect(url_for("home"))  # Redirect to home page after adding
 
-    # Define the enhanced HTML layout
-    add_card_html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Add Card</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        <style>
-            body {
-                background-color: #f8f9fa;
-                font-family: Arial, sans-serif;
-                padding: 20px;
-            }
-            .container {
-                max-width: 600px;
-                margin: auto;
-                padding: 20px;
-                background: white;
-                border-radius: 10px;
-                box-shadow: 0px 4px 8px rgba(0, 0, 0, 0.2);
-            }
-            .btn-primary {
-                width: 100%;
-                margin-top: 15px;
-            }
-            .form-group {
-                margin-bottom: 15px;
-            }
-            h1 {
-                text-align: center;
-                margin-bottom: 20px;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Add a New Sideboard Card</h1>
-            <form action="{{ url_for('add_card') }}" method="post">
-                <div class="form-group">
-                    <label for="card_name" class="form-label">Card Name:</label>
-                    <input type="text" class="form-control" id="card_name" name="card_name" required>
-                </div>
-
-                <div class="form-group">
-                    <label for="max_copies" class="form-label">Max Copies Allowed:</label>
-                    <input type="number" class="form-control" id="max_copies" name="max_copies" required>
-                </div>
-
-                <h3 class="mt-3">Enter Effectiveness Scores (1-10):</h3>
-                {% for deck in deck_names %}
-                <div class="form-group">
-                    <label for="{{ deck }}" class="form-label">{{ deck }}:</label>
-                    <input type="number" class="form-control" id="{{ deck }}" name="effectiveness[{{ deck }}]" min="0" max="10" required>
-                </div>
-                {% endfor %}
-
-                <button type="submit" class="btn btn-primary">Add Card</button>
-                <a href="{{ url_for('home') }}" class="btn btn-secondary mt-2">Back to Home</a>
-            </form>
-        </div>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
-    """
-
-    return render_template_string(add_card_html, deck_names=deck_names)
+    return render_template("add_card.html", deck_names=deck_names)
 
 
 @app.route("/add_deck", methods=["GET", "POST"])
 def add_deck():
-    global effectiveness_scores_file_path, matchup_data_file_path
-
-    # Read existing data from Google Sheets
-    update_data()
+    # Read existing data from the cached snapshot
+    data = data_cache.get()
+    effectiveness_scores_df = data.effectiveness_scores_df
 
     if request.method == "POST":
         # Get user inputs from the form
@@ -358,132 +228,27 @@ def add_deck():
         mtgo_pr = float(request.form.get("mtgo_pr"))
         max_slots = int(request.form.get("max_slots"))
 
-        # Add new deck to Matchup_Data_Cloud
-        new_deck_row = [deck_name, mtgo_pr, max_slots, 0, 0]
-        sheet1 = matchup_data_file_path.sheet1  # Get first sheet of Matchup_Data_Cloud
-        sheet1.append_row(new_deck_row, value_input_option="USER_ENTERED")
-
         # Get effectiveness scores for the new deck
-        effectiveness_values = []
-        for index, row in effectiveness_scores_df.iterrows():
-            value = int(request.form.get(f"effectiveness[{row['Card Name']}]"))
-            effectiveness_values.append(value)
-
-        # Add the new deck as a column in Effectiveness_Scores_Cloud
-        sheet2 = effectiveness_scores_file_path.sheet1  # Get first sheet of Effectiveness_Scores_Cloud
-        all_data = sheet2.get_all_values()  # Fetch all values to preserve structure
-
-        # Insert new column with effectiveness scores
-        if all_data:
-            for i in range(1, len(all_data)):  # Skip header row
-                all_data[i].append(str(effectiveness_values[i - 1]))
-
-            # Add deck name to the header row
-            all_data[0].append(deck_name)
-
-            # Update the entire sheet in one batch operation
-            sheet2.update(all_data)
+        effectiveness_values = {}
+        for card in effectiveness_scores_df["Card Name"]:
+            effectiveness_values[card] = int(request.form.get(f"effectiveness[{card}]"))
 
+        try:
+            storage.add_deck(deck_name, mtgo_pr, max_slots, effectiveness_values)
+        except AlreadyExists as e:
+            return f"<h1>Error</h1><p>{e}</p>"
+        data_cache.invalidate()
         return redirect(url_for("home"))  # Redirect to home page after adding
 
-    # Enhanced HTML Layout
-    add_deck_html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Add Deck</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        <style>
-            body {
-                background-color: #f8f9fa;
-                font-family: Arial, sans-serif;
-                padding: 20px;
-            }
-            .container {
-                max-width: 600px;
-                margin: auto;
-                padding: 20px;
-                background: white;
-                border-radius: 10px;
-                box-shadow: 0px 4px 8px rgba(0, 0, 0, 0.2);
-            }
-            .btn-primary {
-                width: 100%;
-                margin-top: 15px;
-            }
-            .form-group {
-                margin-bottom: 15px;
-            }
-            h1 {
-                text-align: center;
-                margin-bottom: 20px;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Add a New Deck</h1>
-            <form action="{{ url_for('add_deck') }}" method="post">
-                <div class="form-group">
-                    <label for="deck_name" class="form-label">Deck Name:</label>
-                    <input type="text" class="form-control" id="deck_name" name="deck_name" required>
-                </div>
-
-                <div class="form-group">
-                    <label for="mtgo_pr" class="form-label">MTGO PR (Play Rate Estimation):</label>
-                    <input type="number" class="form-control" id="mtgo_pr" name="mtgo_pr" step="0.01" required>
-                </div>
-
-                <div class="form-group">
-                    <label for="max_slots" class="form-label">Max Sideboard Slots:</label>
-                    <input type="number" class="form-control" id="max_slots" name="max_slots" required>
-                </div>
-
-                <h3 class="mt-3">Enter Effectiveness Scores (1-10):</h3>
-                {% for card in card_names %}
-                <div class="form-group">
-                    <label for="{{ card }}" class="form-label">{{ card }}:</label>
-                    <input type="number" class="form-control" id="{{ card }}" name="effectiveness[{{ card }}]" min="0" max="10" required>
-                </div>
-                {% endfor %}
-
-                <button type="submit" class="btn btn-primary">Add Deck</button>
-                <a href="{{ url_for('home') }}" class="btn btn-secondary mt-2">Back to Home</a>
-            </form>
-        </div>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
-    """
-
-    return render_template_string(add_deck_html, card_names=effectiveness_scores_df["Card Name"].tolist())
+    return render_template("add_deck.html", card_names=effectiveness_scores_df["Card Name"].tolist())
 
 @app.route("/add_match", methods=["GET", "POST"])
 def add_match():
-    global matchup_data_file_path
-
-    # Load existing matchup data from Google Sheets
-    update_data()
-    sheet = matchup_data_file_path.sheet1  # Get the first sheet
-
-    # Read the data from Google Sheets
-    matchup_data_list = sheet.get_all_values()
-    header = matchup_data_list[0]  # First row (column names)
-    data_rows = matchup_data_list[1:]  # All remaining rows (actual data)
-
     if request.method == "POST":
         # Get user inputs from the form
         deck_name = request.form.get("deck_name")
         match_result = request.form.get("match_result")  # Expected format: "2-0", "1-2", etc.
 
-        # Ensure the deck exists
-        deck_names = [row[0] for row in data_rows]  # Extract deck names from first column
-        if deck_name not in deck_names:
-            return f"<h1>Error</h1><p>Deck '{deck_name}' not found. Please add it first.</p>"
-
         # Parse match result
         try:
             wins, losses = map(int, match_result.split("-"))
@@ -493,672 +258,297 @@ def add_match():
         # Determine if the match was won (if wins > losses, it's a match win)
         match_win = 1 if wins > losses else 0
 
-        # Find the row index of the deck
-        row_index = deck_names.index(deck_name) + 2  # +2 because of 1-based index and header row
-
-        # Column indices (1-based indexing for Google Sheets)
-        col_fought = header.index("# of times fought") + 1
-        col_wins = header.index("# of match wins") + 1
-
-        # Read existing values
-        current_fought = int(sheet.cell(row_index, col_fought).value)
-        current_wins = int(sheet.cell(row_index, col_wins).value)
-
-        # Update values
-        new_fought = current_fought + 1
-        new_wins = current_wins + match_win
+        if deck_name not in data_cache.get().deck_index:
+            return f"<h1>Error</h1><p>Deck '{deck_name}' not found. Please add it first.</p>"
 
-        # Batch update to avoid multiple calls
-        sheet.update_cell(row_index, col_fought, new_fought)
-        sheet.update_cell(row_index, col_wins, new_wins)
+        # Acknowledged once it's in the local queue; the stats update right away
+        match_queue.record(deck_name, match_win)
+        data_cache.apply(fold_queued_matches)
 
         return redirect(url_for("home"))  # Redirect to home after adding match
 
-    # Enhanced HTML template
-    add_match_html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Add Match Record</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        <style>
-            body {
-                background-color: #f8f9fa;
-                font-family: Arial, sans-serif;
-                padding: 20px;
-            }
-            .container {
-                max-width: 500px;
-                margin: auto;
-                padding: 20px;
-                background: white;
-                border-radius: 10px;
-                box-shadow: 0px 4px 8px rgba(0, 0, 0, 0.2);
-            }
-            .btn-primary {
-                width: 100%;
-                margin-top: 15px;
-            }
-            .form-group {
-                margin-bottom: 15px;
-            }
-            h1 {
-                text-align: center;
-                margin-bottom: 20px;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Record a Match Result</h1>
-            <form action="{{ url_for('add_match') }}" method="post">
-                <div class="form-group">
-                    <label for="deck_name" class="form-label">Deck Played Against:</label>
-                    <select class="form-select" id="deck_name" name="deck_name" required>
-                        {% for deck in deck_names %}
-                            <option value="{{ deck }}">{{ deck }}</option>
-                        {% endfor %}
-                    </select>
-                </div>
-
-                <div class="form-group">
-                    <label for="match_result" class="form-label">Match Result (e.g., 2-0, 1-2):</label>
-                    <input type="text" class="form-control" id="match_result" name="match_result" pattern="\\d+-\\d+" required>
-                    <small class="form-text text-muted">Enter the result in X-Y format.</small>
-                </div>
-
-                <button type="submit" class="btn btn-primary">Record Match</button>
-                <a href="{{ url_for('home') }}" class="btn btn-secondary mt-2">Back to Home</a>
-            </form>
-        </div>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
-    """
-
-    return render_template_string(add_match_html, deck_names=[row[0] for row in data_rows])
+    return render_template("add_match.html", deck_names=data_cache.get().deck_names)
 
 
 @app.route("/remove_deck", methods=["GET", "POST"])
 def remove_deck():
-    global matchup_data_file_path, effectiveness_scores_file_path
-
-    # Load the latest versions of both Google Sheets
-    update_data()
-
-    sheet1 = matchup_data_file_path.sheet1  # Matchup Data
-    sheet2 = effectiveness_scores_file_path.sheet1  # Effectiveness Scores
-
-    # Extract deck names from Effectiveness Scores (columns after first two)
-    all_data = sheet2.get_all_values()
-    deck_names = all_data[0][2:] if all_data else []  # Extract headers after first two columns
-
     if request.method == "POST":
         deck_name = request.form.get("deck_name")  # Get selected deck
 
-        # Ensure the deck exists
-        if deck_name not in deck_names:
-            return f"<h1>Error</h1><p>Deck '{deck_name}' not found in Effectiveness_Scores_Cloud.</p>"
-        
-        # Load Matchup Data
-        matchup_data_list = sheet1.get_all_values()
-        header = matchup_data_list[0]
-        data_rows = matchup_data_list[1:]
-
-        deck_names_matchup = [row[0] for row in data_rows]  # Deck names from the first column
-
-        if deck_name not in deck_names_matchup:
-            return f"<h1>Error</h1><p>Deck '{deck_name}' not found in Matchup_Data_Cloud.</p>"
+        try:
+            storage.remove_deck(deck_name)
+        except NotFound as e:
+            return f"<h1>Error</h1><p>{e}</p>"
+        data_cache.invalidate()
 
-        ### **STEP 1: Remove Deck (Row) from Matchup_Data_Cloud**
-        row_index = deck_names_matchup.index(deck_name) + 2  # +2 to adjust for 1-based indexing and header
-        sheet1.delete_rows(row_index)
+        return redirect(url_for("home"))  # Redirect to home after deletion
 
-        ### **STEP 2: Remove Deck (Column) from Effectiveness_Scores_Cloud**
-        col_index = deck_names.index(deck_name) + 3  # +3 because first two columns are ignored
-        sheet2.delete_columns(col_index)
 
-        return redirect(url_for("home"))  # Redirect to home after deletion
+    # Deck names from the cached Effectiveness Scores (columns after first two)
+    deck_names = list(data_cache.get().effectiveness_scores_df.columns[2:])
 
-    # Enhanced HTML Template
-    remove_deck_html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Remove Deck</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        <script>
-            function confirmDeletion() {
-                let selectedDeck = document.getElementById("deck_name").value;
-                return confirm("Are you sure you want to remove '" + selectedDeck + "'? This action cannot be undone.");
-            }
-        </script>
-        <style>
-            body {
-                background-color: #f8f9fa;
-                font-family: Arial, sans-serif;
-                padding: 20px;
-            }
-            .container {
-                max-width: 500px;
-                margin: auto;
-                padding: 20px;
-                background: white;
-                border-radius: 10px;
-                box-shadow: 0px 4px 8px rgba(0, 0, 0, 0.2);
-            }
-            .btn-danger {
-                width: 100%;
-                margin-top: 15px;
-            }
-            .form-group {
-                margin-bottom: 15px;
-            }
-            h1 {
-                text-align: center;
-                margin-bottom: 20px;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Remove a Deck</h1>
-            <form action="{{ url_for('remove_deck') }}" method="post" onsubmit="return confirmDeletion()">
-                <div class="form-group">
-                    <label for="deck_name" class="form-label">Select Deck to Remove:</label>
-                    <select class="form-select" id="deck_name" name="deck_name" required>
-                        {% for deck in deck_names %}
-                            <option value="{{ deck }}">{{ deck }}</option>
-                        {% endfor %}
-                    </select>
-                </div>
-
-                <button type="submit" class="btn btn-danger">Remove Deck</button>
-                <a href="{{ url_for('home') }}" class="btn btn-secondary mt-2">Back to Home</a>
-            </form>
-        </div>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
-    """
-
-    return render_template_string(remove_deck_html, deck_names=deck_names)
+    return render_template("remove_deck.html", deck_names=deck_names)
 
 @app.route("/remove_card", methods=["GET", "POST"])
 def remove_card():
-    global effectiveness_scores_file_path
-
-    # Load the latest version of Effectiveness_Scores_Cloud
-    update_data()
-
-    sheet = effectiveness_scores_file_path.sheet1  # First sheet in Google Sheets
-
-    # Read data from Google Sheets
-    all_data = sheet.get_all_values()
-    header = all_data[0] if all_data else []  # Extract column names
-    data_rows = all_data[1:]  # All rows excluding headers
-
-    # Get the list of card names (first column)
-    card_names = [row[0] for row in data_rows]
-
     if request.method == "POST":
         card_name = request.form.get("card_name")  # Get the selected card
 
-        # Check if the card exists
-        if card_name not in card_names:
-            return f"<h1>Error</h1><p>Card '{card_name}' not found in Effectiveness_Scores_Cloud.</p>"
-
-        # Find the row index of the card
-        row_index = card_names.index(card_name) + 2  # +2 because of 1-based index and header
-
-        # Delete the row in Google Sheets
-        sheet.delete_rows(row_index)
+        try:
+            storage.remove_card(card_name)
+        except NotFound as e:
+            return f"<h1>Error</h1><p>{e}</p>"
+        data_cache.invalidate()
 
         return redirect(url_for("home"))  # Redirect to home after deletion
 
-    # Enhanced HTML Template
-    remove_card_html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Remove Card</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        <script>
-            function confirmDeletion() {
-                let selectedCard = document.getElementById("card_name").value;
-                return confirm("Are you sure you want to remove '" + selectedCard + "'? This action cannot be undone.");
-            }
-        </script>
-        <style>
-            body {
-                background-color: #f8f9fa;
-                font-family: Arial, sans-serif;
-                padding: 20px;
-            }
-            .container {
-                max-width: 500px;
-                margin: auto;
-                padding: 20px;
-                background: white;
-                border-radius: 10px;
-                box-shadow: 0px 4px 8px rgba(0, 0, 0, 0.2);
-            }
-            .btn-danger {
-                width: 100%;
-                margin-top: 15px;
-            }
-            .form-group {
-                margin-bottom: 15px;
-            }
-            h1 {
-                text-align: center;
-                margin-bottom: 20px;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Remove a Card</h1>
-            <form action="{{ url_for('remove_card') }}" method="post" onsubmit="return confirmDeletion()">
-                <div class="form-group">
-                    <label for="card_name" class="form-label">Select Card to Remove:</label>
-                    <select class="form-select" id="card_name" name="card_name" required>
-                        {% for card in card_names %}
-                            <option value="{{ card }}">{{ card }}</option>
-                        {% endfor %}
-                    </select>
-                </div>
-
-                <button type="submit" class="btn btn-danger">Remove Card</button>
-                <a href="{{ url_for('home') }}" class="btn btn-secondary mt-2">Back to Home</a>
-            </form>
-        </div>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
-    """
-
-    return render_template_string(remove_card_html, card_names=card_names)
+    return render_template("remove_card.html", card_names=data_cache.get().card_names)
 
 @app.route("/view_decks", methods=["GET", "POST"])
 def view_decks():
-    global matchup_data_file_path
-
-    # Load the latest version of Matchup_Data_Cloud
-    update_data()
-
-    sheet = matchup_data_file_path.sheet1  # Get the first sheet
-
-    # Read data from Google Sheets
-    all_data = sheet.get_all_values()
-    header = all_data[0] if all_data else []  # Extract column names
-    data_rows = all_data[1:]  # All rows excluding headers
-
-    # Extract deck names
-    deck_names = [row[0] for row in data_rows] if data_rows else []
-
     if request.method == "POST":
         # Handle deck editing form submission
         deck_name = request.form.get("deck_name")
         new_mtgo_pr = float(request.form.get("new_mtgo_pr"))
         new_max_slots = int(request.form.get("new_max_slots"))
 
-        # Ensure the deck exists
-        if deck_name not in deck_names:
-            return f"<h1>Error</h1><p>Deck '{deck_name}' not found in Matchup_Data_Cloud.</p>"
-
-        # Find the row index of the deck
-        row_index = deck_names.index(deck_name) + 2  # +2 to adjust for 1-based indexing and header row
-
-        # Column indices (1-based index for Google Sheets)
-        col_mtgo_pr = header.index("MTGO PR") + 1
-        col_max_slots = header.index("Max Slots") + 1
-
-        # Update the deck's values in Google Sheets
-        sheet.update_cell(row_index, col_mtgo_pr, new_mtgo_pr)
-        sheet.update_cell(row_index, col_max_slots, new_max_slots)
+        try:
+            storage.update_deck(deck_name, new_mtgo_pr, new_max_slots)
+        except NotFound as e:
+            return f"<h1>Error</h1><p>{e}</p>"
+        data_cache.invalidate()
 
         return redirect(url_for("view_decks"))  # Refresh the page after updating
 
-    # Convert the deck data to an HTML table
-    deck_table = "<table class='table table-striped table-hover'><thead><tr>"
-    deck_table += "".join(f"<th>{col}</th>" for col in header)
-    deck_table += "</tr></thead><tbody>"
-    for row in data_rows:
-        deck_table += "<tr>" + "".join(f"<td>{col}</td>" for col in row) + "</tr>"
-    deck_table += "</tbody></table>"
-
-    # Enhanced HTML Template
-    view_decks_html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>View & Edit Decks</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        <style>
-            body {
-                background-color: #f8f9fa;
-                font-family: Arial, sans-serif;
-                padding: 20px;
-            }
-            .container {
-                max-width: 800px;
-                margin: auto;
-                padding: 20px;
-                background: white;
-                border-radius: 10px;
-                box-shadow: 0px 4px 8px rgba(0, 0, 0, 0.2);
-            }
-            .btn-primary, .btn-secondary {
-                width: 100%;
-                margin-top: 10px;
-            }
-            h1, h2 {
-                text-align: center;
-                margin-bottom: 20px;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Current Decks</h1>
-            <div class="table-responsive">
-                {{ deck_table | safe }}
-            </div>
-
-            <h2>Edit a Deck</h2>
-            <form action="{{ url_for('view_decks') }}" method="post">
-                <div class="form-group">
-                    <label for="deck_name" class="form-label">Select Deck:</label>
-                    <select class="form-select" id="deck_name" name="deck_name" required>
-                        {% for deck in deck_names %}
-                            <option value="{{ deck }}">{{ deck }}</option>
-                        {% endfor %}
-                    </select>
-                </div>
-
-                <div class="form-group">
-                    <label for="new_mtgo_pr" class="form-label">New MTGO PR (Play Rate Estimation):</label>
-                    <input type="number" class="form-control" id="new_mtgo_pr" name="new_mtgo_pr" step="0.001" required>
-                </div>
-
-                <div class="form-group">
-                    <label for="new_max_slots" class="form-label">New Max Sideboard Slots:</label>
-                    <input type="number" class="form-control" id="new_max_slots" name="new_max_slots" required>
-                </div>
-
-                <button type="submit" class="btn btn-primary">Update Deck</button>
-                <a href="{{ url_for('home') }}" class="btn btn-secondary">Back to Home</a>
-            </form>
-        </div>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
-    """
-
-    return render_template_string(view_decks_html, deck_table=deck_table, deck_names=deck_names)
+    # One page of the table from the cached snapshot, streamed as it renders
+    data = data_cache.get()
+    table = table_page(data.matchup_data_df, request.args)
+
+    return stream_page("view_decks.html", table=table, deck_names=list(data.deck_names))
 
 @app.route("/view_cards", methods=["GET", "POST"])
 def view_cards():
-    global effectiveness_scores_file_path
-
-    # Load the latest version of Effectiveness_Scores_Cloud
-    update_data()
-
-    sheet = effectiveness_scores_file_path.sheet1  # Get the first sheet
-
-    # Read data from Google Sheets
-    all_data = sheet.get_all_values()
-    header = all_data[0] if all_data else []  # Extract column names
-    data_rows = all_data[1:]  # All rows excluding headers
-
-    # Extract card names (first column)
-    card_names = [row[0] for row in data_rows] if data_rows else []
-    deck_names = header[2:] if len(header) > 2 else []  # Skip first two columns
-
     if request.method == "POST":
         # Handle card editing form submission
         card_name = request.form.get("card_name")
 
-        # Ensure the card exists
-        if card_name not in card_names:
-            return f"<h1>Error</h1><p>Card '{card_name}' not found in Effectiveness_Scores_Cloud.</p>"
-
-        # Find the row index of the card
-        row_index = card_names.index(card_name) + 2  # +2 to adjust for 1-based indexing and header row
-        card_row = data_rows[row_index - 2]  # Retrieve the row's current data
-
-        # Column index for "Max Copies"
-        col_max_copies = header.index("Max Copies") + 1
-        new_max_copies = request.form.get("new_max_copies")
-        
-        # Use existing value if the field is left empty
-        if new_max_copies.strip() == "":
-            new_max_copies = card_row[col_max_copies - 1]  # Adjust index to match data_rows
-        else:
-            new_max_copies = int(new_max_copies)
-
-        # Update max copies in Google Sheets
-        sheet.update_cell(row_index, col_max_copies, new_max_copies)
-
-        # Update effectiveness scores
-        updates = []
-        for deck in deck_names:
-            new_score = request.form.get(f"effectiveness[{deck}]")
-            col_index = header.index(deck) + 1  # Get column index for the deck
-            
-            # Use existing value if the field is left empty
-            if new_score.strip() == "":
-                new_score = card_row[col_index - 1]  # Adjust index to match data_rows
-            else:
-                new_score = int(new_score)
-            
-            updates.append({
-                "range": rowcol_to_a1(row_index, col_index),  # Convert index to Google Sheets column letter
-                "values": [[new_score]]
-            })
+        # Fields left empty keep their existing values
+        new_max_copies = request.form.get("new_max_copies", "")
+        new_max_copies = int(new_max_copies) if new_max_copies.strip() != "" else None
 
-        # Perform batch update
-        sheet.batch_update(updates)
+        new_scores = {}
+        for deck in data_cache.get().effectiveness_scores_df.columns[2:]:
+            new_score = request.form.get(f"effectiveness[{deck}]", "")
+            if new_score.strip() != "":
+                new_scores[deck] = int(new_score)
+
+        try:
+            storage.update_card(card_name, new_max_copies, new_scores)
+        except NotFound as e:
+            return f"<h1>Error</h1><p>{e}</p>"
+        data_cache.invalidate()
 
         return redirect(url_for("view_cards"))  # Refresh the page after updating
 
-    # Convert the card data to an HTML table
-    card_table = "<table class='table table-striped table-hover'><thead><tr>"
-    card_table += "".join(f"<th>{col}</th>" for col in header)
-    card_table += "</tr></thead><tbody>"
-    for row in data_rows:
-        card_table += "<tr>" + "".join(f"<td>{col}</td>" for col in row) + "</tr>"
-    card_table += "</tbody></table>"
-
-    # Enhanced HTML Template
-    view_cards_html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>View & Edit Cards</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        <style>
-            body {
-                background-color: #f8f9fa;
-                font-family: Arial, sans-serif;
-                padding: 20px;
-            }
-            .container {
-                max-width: 800px;
-                margin: auto;
-                padding: 20px;
-                background: white;
-                border-radius: 10px;
-                box-shadow: 0px 4px 8px rgba(0, 0, 0, 0.2);
-            }
-            .btn-primary, .btn-secondary {
-                width: 100%;
-                margin-top: 10px;
-            }
-            .table-responsive {
-                margin-bottom: 20px;
-            }
-            h1, h2 {
-                text-align: center;
-                margin-bottom: 20px;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Current Sideboard Cards</h1>
-            <div class="table-responsive">
-                {{ card_table | safe }}
-            </div>
-
-            <h2>Edit a Card</h2>
-            <form action="{{ url_for('view_cards') }}" method="post">
-                <div class="form-group">
-                    <label for="card_name" class="form-label">Select Card:</label>
-                    <select class="form-select" id="card_name" name="card_name" required>
-                        {% for card in card_names %}
-                            <option value="{{ card }}">{{ card }}</option>
-                        {% endfor %}
-                    </select>
-                </div>
-
-                <div class="form-group">
-                    <label for="new_max_copies" class="form-label">New Max Copies:</label>
-                    <input type="number" class="form-control" id="new_max_copies" name="new_max_copies" min="0">
-                </div>
-
-                <h3 class="mt-3">Update Effectiveness Scores (1-10):</h3>
-                {% for deck in deck_names %}
-                <div class="form-group">
-                    <label for="{{ deck }}" class="form-label">{{ deck }}:</label>
-                    <input type="number" class="form-control" id="{{ deck }}" name="effectiveness[{{ deck }}]" min="0" max="10">
-                </div>
-                {% endfor %}
-
-                <button type="submit" class="btn btn-primary">Update Card</button>
-                <a href="{{ url_for('home') }}" class="btn btn-secondary">Back to Home</a>
-            </form>
-        </div>
-
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
-    """
-
-    return render_template_string(view_cards_html, 
-                                  card_table=card_table, 
-                                  card_names=card_names,
-                                  deck_names=deck_names)
+    # One page of the table from the cached snapshot, streamed as it renders;
+    # Card Name and Max Copies always show, the deck columns can be picked
+    effectiveness_scores_df = data_cache.get().effectiveness_scores_df
+    table = table_page(effectiveness_scores_df, request.args, fixed_columns=2)
+
+    return stream_page("view_cards.html",
+                       table=table,
+                       card_names=effectiveness_scores_df.iloc[:, 0].tolist(),
+                       deck_names=list(effectiveness_scores_df.columns[2:]))  # Skip first two columns
 
 @app.route("/sideboard")
 def run_sideboard_optimizer():
     try:
-        update_data()
-        sideboard_map = assign_sideboard_cards(15)
-        sideboard_map = refine_sideboard(sideboard_map)
-
-        # Convert sideboard results into an HTML table
-        sideboard_table = """
-        <table class="table table-striped table-hover">
-            <thead class="thead-dark">
-                <tr>
-                    <th>Card</th>
-                    <th>Quantity</th>
-                </tr>
-            </thead>
-            <tbody>
-        """
-        for card, quantity in sideboard_map.items():
-            sideboard_table += f"<tr><td>{card}</td><td>{quantity}</td></tr>"
-        sideboard_table += "</tbody></table>"
-
-        # Bootstrap-enhanced HTML
-        sideboard_html = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1">
-            <title>Sideboard Optimizer</title>
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-            <style>
-                body {{
-                    background-color: #f8f9fa;
-                    font-family: Arial, sans-serif;
-                    padding: 20px;
-                }}
-                .container {{
-                    max-width: 600px;
-                    margin: auto;
-                    padding: 20px;
-                    background: white;
-                    border-radius: 10px;
-                    box-shadow: 0px 4px 8px rgba(0, 0, 0, 0.2);
-                    text-align: center;
-                }}
-                h1 {{
-                    text-align: center;
-                    margin-bottom: 20px;
-                }}
-                .btn-primary, .btn-secondary {{
-                    width: 100%;
-                    margin-top: 10px;
-                }}
-                .table {{
-                    margin-top: 15px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Optimized Sideboard</h1>
-                {sideboard_table}
-                <a href="{{{{ url_for('home') }}}}" class="btn btn-secondary">Back to Home</a>
-            </div>
-
-            <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-        </body>
-        </html>
-        """
-
-        return render_template_string(sideboard_html)
+        data = data_cache.get()
+        mode = request.args.get("mode", "greedy")
+
+        # Reloading the page while the job runs joins the same job
+        job = submit_optimizer_job(data, mode)
+        if not job.wait(request_wait):
+            return render_template("sideboard_pending.html", job=job)
+        if job.error is not None:
+            raise job.error
+        sideboard_map, result = job.result
+
+        # Exact mode solves for the optimum and reports how far the greedy result is from it
+        solver_status = greedy_note = None
+        if result is not None:
+            solver_status = "Optimal" if result.optimal else f"Best found (upper bound {result.upper_bound:.3f})"
+            if result.greedy_feasible:
+                greedy_note = f"optimality gap {result.gap:.1%}"
+            else:
+                greedy_note = "no optimality gap: the greedy sideboard exceeds a deck's Max Slots"
+
+        return render_template("sideboard.html",
+                               sideboard_map=sideboard_map,
+                               result=result,
+                               solver_status=solver_status,
+                               greedy_note=greedy_note)
+
+    except Exception as e:
+        return render_template("sideboard_error.html", error=e)
+
+def submit_optimizer_job(data, mode):
+    # The job ID names the data and parameters, so every request for the same
+    # sideboard shares one job, and any worker can pick up a poll for it
+    if mode not in MODES:
+        raise ValueError(f"Unknown optimizer mode '{mode}'. Use 'greedy' or 'exact'.")
+    return optimizer_jobs.submit(f"{mode}-{data.content_hash}", lambda: optimizer_results.get_or_compute(
+        result_key(data, mode, 15),
+        lambda: optimize_sideboard(data, mode, 15)
+    ))
+
+# === JSON API ===
+# Same data as the pages without any templating. Each response carries an ETag
+# for the data it was built from, so pollers that send If-None-Match get a 304
+# without the body being built or sent. It is strong when that data fixes the
+# body byte for byte, weak when the body can also depend on timing.
+def conditional_json(etag, build_body, weak=False):
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(build_body(), mimetype="application/json")
+    response.set_etag(etag, weak=weak)
+    response.headers["Cache-Control"] = "no-cache"  # Cache, but always revalidate
+    return response
+
+def compact_json(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+def api_error(e, status=503):
+    return app.response_class(compact_json({"error": str(e)}), status=status, mimetype="application/json")
+
+@app.route("/api/sideboard")
+def api_sideboard():
+    mode = request.args.get("mode", "greedy")
+    if mode not in MODES:
+        return api_error(f"Unknown optimizer mode '{mode}'. Use 'greedy' or 'exact'.", status=400)
+    try:
+        data = data_cache.get()
+    except Exception as e:
+        return api_error(e)
+
+    # The sideboard only depends on what the optimizer reads, so edits elsewhere keep
+    # the ETag. The exact solver runs against a clock: how far it gets (nodes, the
+    # bound, even the sideboard when it is cut off) varies from run to run.
+    etag = f"sideboard-{mode}-{data.content_hash}"
+    weak = mode == "exact"
+    if request.if_none_match.contains_weak(etag):
+        return conditional_json(etag, None, weak=weak)  # 304 without running the optimizer
+
+    try:
+        job = submit_optimizer_job(data, mode)
+    except JobQueueFull as e:
+        return queue_full(e)
+    if not job.wait(request_wait):
+        return job_response(job, status=202)  # Poll the Location header for the result
+    if job.error is not None:
+        return api_error(job.error, status=500)
+    return conditional_json(etag, lambda: compact_json(sideboard_body(mode, *job.result)), weak=weak)
+
+def sideboard_body(mode, sideboard_map, result):
+    body = {"mode": mode, "sideboard": sideboard_map}
+    if result is not None:
+        body["solver"] = {
+            "optimal": bool(result.optimal),
+            "objective": float(result.objective),
+            "upper_bound": float(result.upper_bound),
+            "nodes": int(result.nodes),
+            "greedy_objective": float(result.greedy_objective),
+            "greedy_feasible": bool(result.greedy_feasible),
+            "gap": float(result.gap) if result.gap is not None else None,
+        }
+    return body
+
+# Optimizer jobs: POST starts one (or joins the running one for the same data
+# and mode) and answers 202 with its URL. GET on that URL reports the job, and
+# with ?wait=<seconds> holds the request until the job finishes or the wait
+# runs out, whichever comes first.
+def job_response(job, status=200):
+    body = {"id": job.id, "status": job.status}
+    if job.status == "done":
+        body.update(sideboard_body(job.id.split("-", 1)[0], *job.result))
+    elif job.status == "failed":
+        body["error"] = str(job.error)
+    response = app.response_class(compact_json(body), status=status, mimetype="application/json")
+    response.headers["Location"] = url_for("api_sideboard_job", job_id=job.id)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+def queue_full(e):
+    response = api_error(e)
+    response.headers["Retry-After"] = "5"
+    return response
+
+@app.route("/api/sideboard/jobs", methods=["POST"])
+def api_sideboard_jobs():
+    mode = request.values.get("mode", "greedy")
+    if mode not in MODES:
+        return api_error(f"Unknown optimizer mode '{mode}'. Use 'greedy' or 'exact'.", status=400)
+    try:
+        data = data_cache.get()
+    except Exception as e:
+        return api_error(e)
+    try:
+        job = submit_optimizer_job(data, mode)
+    except JobQueueFull as e:
+        return queue_full(e)
+    return job_response(job, status=202)
+
+@app.route("/api/sideboard/jobs/<job_id>")
+def api_sideboard_job(job_id):
+    job = optimizer_jobs.get(job_id)
+    if job is None:
+        # Started by another worker, or expired here: rerun it if it is for the data we serve
+        mode, _, content_hash = job_id.partition("-")
+        try:
+            data = data_cache.get()
+        except Exception as e:
+            return api_error(e)
+        if mode not in MODES or content_hash != data.content_hash:
+            return api_error(f"No optimizer job '{job_id}'. It may be for data that has since changed.", status=404)
+        try:
+            job = submit_optimizer_job(data, mode)
+        except JobQueueFull as e:
+            return queue_full(e)
 
+    try:
+        wait = float(request.args.get("wait", "0"))
+    except ValueError:
+        return api_error("wait must be a number of seconds", status=400)
+    job.wait(min(wait, job_wait) if wait > 0 else 0)
+    return job_response(job)
+
+@app.route("/api/decks")
+def api_decks():
+    try:
+        data = data_cache.get()
+    except Exception as e:
+        return api_error(e)
+    # {"columns": [...], "data": [[...], ...]} in Matchup_Data_Cloud order
+    return conditional_json(f"decks-{data.tables_hash}", lambda: api_bodies.get_or_compute(
+        ("decks", data.tables_hash), lambda: data.matchup_data_df.to_json(orient="split", index=False)
+    ))
+
+@app.route("/api/cards")
+def api_cards():
+    try:
+        data = data_cache.get()
     except Exception as e:
-        error_html = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1">
-            <title>Error</title>
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        </head>
-        <body>
-            <div class="container mt-5">
-                <div class="alert alert-danger text-center" role="alert">
-                    ❌ Error running program: {e}
-                </div>
-                <a href="{{{{ url_for('home') }}}}" class="btn btn-secondary">Back to Home</a>
-            </div>
-        </body>
-        </html>
-        """
-        return render_template_string(error_html)
+        return api_error(e)
+    # {"columns": [...], "data": [[...], ...]} in Effectiveness_Scores_Cloud order
+    return conditional_json(f"cards-{data.tables_hash}", lambda: api_bodies.get_or_compute(
+        ("cards", data.tables_hash), lambda: data.effectiveness_scores_df.to_json(orient="split", index=False)
+    ))
+
+@app.route("/metrics")
+def metrics_endpoint():
+    # Prometheus text format, for this worker process only
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
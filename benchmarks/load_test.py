@@ -0,0 +1,369 @@
+# Load test for the whole app: starts it on the Sheets emulator
+# (sheets_emulator.py, seeded with synthetic tables), drives every route with a
+# mostly-read mix from concurrent clients, and reports throughput, latency
+# percentiles and Sheets API calls per route. Writes a JSON report; pass an
+# earlier one with --compare to see how a change moved p95 latency.
+#
+#   python benchmarks/load_test.py --clients 16 --duration 30
+#   python benchmarks/load_test.py --output after.json --compare before.json
+#
+# The app runs on Flask's threaded server by default, a single process. To
+# measure the production setup, install gunicorn and pass e.g.
+#   --workers 2 --threads 4 --server-command \
+#       "{python} -m gunicorn -w {workers} --threads {threads} -b 127.0.0.1:{port} App:app"
+#
+# Settings such as DATA_CACHE_TTL are passed through from the environment;
+# the app's own Sheets budget (SHEETS_CALLS_PER_MINUTE) applies as usual.
+# --url runs against a server that is already up instead (backend calls are
+# only counted if it runs with SHEETS_EMULATOR_STATS=<--stats-dir>).
+import argparse
+import glob
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+
+from sheets_emulator import sheet_values
+from synthetic import make_tables
+
+
+# (route label, weight): about 85% reads, like a page that is looked at far
+# more than it is edited
+MIX = [
+    ("GET /", 8),
+    ("GET /sideboard", 15),
+    ("GET /sideboard?mode=exact", 4),
+    ("GET /api/sideboard", 4),
+    ("GET /view_decks", 8),
+    ("GET /view_decks?sort=...", 4),
+    ("GET /view_cards", 8),
+    ("GET /view_cards?page=2", 4),
+    ("GET /add_match", 6),
+    ("GET /add_card", 2),
+    ("GET /add_deck", 2),
+    ("GET /remove_deck", 2),
+    ("GET /remove_card", 2),
+    ("POST /add_match", 12),
+    ("POST /view_decks", 3),
+    ("POST /view_cards", 3),
+    ("POST /add_card + /remove_card", 1),
+    ("POST /add_deck + /remove_deck", 1),
+]
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class TimedSession(requests.Session):
+    # Stamps each response with the wall time of the whole call, body and any
+    # redirects included; response.elapsed stops once the first headers arrive
+    def request(self, *args, **kwargs):
+        start = time.perf_counter()
+        response = super().request(*args, **kwargs)
+        response.wall_seconds = time.perf_counter() - start
+        return response
+
+
+class Workload:
+    def __init__(self, base_url, deck_names, card_names, seed):
+        self.base_url = base_url
+        self.deck_names = deck_names
+        self.card_names = card_names
+        self.seed = seed
+        # Decks and cards ever added; forms carry a score for each, since a
+        # worker with an older snapshot may still expect one
+        self.all_decks = list(deck_names)
+        self.all_cards = list(card_names)
+        self.added = 0
+        # Adding and removing decks or cards changes every form, one at a time
+        self.structure_lock = threading.Lock()
+
+    def run(self, label, session, rnd, record):
+        url = self.base_url
+        if label == "GET /view_decks?sort=...":
+            record(label, session.get(url + "/view_decks", params={"sort": "# of times fought", "order": "desc", "q": "1"}))
+        elif label == "GET /view_cards?page=2":
+            record(label, session.get(url + "/view_cards", params={"page": 2, "per_page": 20}))
+        elif label.startswith("GET "):
+            record(label, session.get(url + label[4:]))
+        elif label == "POST /add_match":
+            record(label, session.post(url + "/add_match", data={
+                "deck_name": rnd.choice(self.deck_names), "match_result": rnd.choice(["2-0", "2-1", "1-2", "0-2"]),
+            }))
+        elif label == "POST /view_decks":
+            record(label, session.post(url + "/view_decks", data={
+                "deck_name": rnd.choice(self.deck_names),
+                "new_mtgo_pr": round(rnd.uniform(0.005, 0.12), 4),
+                "new_max_slots": rnd.randint(2, 8),
+            }))
+        elif label == "POST /view_cards":
+            record(label, session.post(url + "/view_cards", data={
+                "card_name": rnd.choice(self.card_names),
+                "new_max_copies": rnd.randint(1, 4),
+                f"effectiveness[{rnd.choice(self.deck_names)}]": rnd.randint(0, 10),
+            }))
+        elif label == "POST /add_card + /remove_card":
+            with self.structure_lock:
+                self.added += 1
+                card_name = f"Load Card {self.seed}-{self.added}"
+                self.all_cards.append(card_name)
+                form = {"card_name": card_name, "max_copies": 2}
+                form.update({f"effectiveness[{deck}]": rnd.randint(0, 10) for deck in self.all_decks})
+                record("POST /add_card", session.post(url + "/add_card", data=form))
+                record("POST /remove_card", session.post(url + "/remove_card", data={"card_name": card_name}))
+        elif label == "POST /add_deck + /remove_deck":
+            with self.structure_lock:
+                self.added += 1
+                deck_name = f"Load Deck {self.seed}-{self.added}"
+                self.all_decks.append(deck_name)
+                form = {"deck_name": deck_name, "mtgo_pr": 0.01, "max_slots": 3}
+                form.update({f"effectiveness[{card}]": rnd.randint(0, 10) for card in self.all_cards})
+                record("POST /add_deck", session.post(url + "/add_deck", data=form))
+                record("POST /remove_deck", session.post(url + "/remove_deck", data={"deck_name": deck_name}))
+
+
+def backend_calls(stats_dir):
+    # Sheets API calls so far, summed over every server process
+    total = 0
+    for path in glob.glob(os.path.join(stats_dir, "*.json")):
+        try:
+            with open(path) as f:
+                total += sum(json.load(f)["calls"].values())
+        except (OSError, ValueError):
+            pass
+    return total
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, scratch):
+    # The app on the emulator, seeded with synthetic tables
+    # Returns (process, url, stats dir, matchup table, effectiveness table)
+    matchup_data_df, effectiveness_scores_df = make_tables(args.cards, args.decks, args.seed)
+    sheets_path = os.path.join(scratch, "sheets.json")
+    with open(sheets_path, "w") as f:
+        json.dump({
+            "Matchup_Data_Cloud": sheet_values(matchup_data_df),
+            "Effectiveness_Scores_Cloud": sheet_values(effectiveness_scores_df),
+        }, f)
+
+    stats_dir = os.path.join(scratch, "stats")
+    os.makedirs(stats_dir)
+    env = dict(
+        os.environ,
+        SHEETS_EMULATOR=sheets_path,
+        SHEETS_EMULATOR_LATENCY=str(args.latency),
+        SHEETS_EMULATOR_JITTER=str(args.jitter),
+        SHEETS_EMULATOR_ERROR_RATE=str(args.error_rate),
+        SHEETS_EMULATOR_STATS=stats_dir,
+        SNAPSHOT_DIR=os.path.join(scratch, "snapshot"),
+        MATCH_QUEUE_PATH=os.path.join(scratch, "match_queue.db"),
+    )
+    if args.per_minute:
+        env["SHEETS_EMULATOR_PER_MINUTE"] = str(args.per_minute)
+
+    port = free_port()
+    command = args.server_command.format(
+        python=sys.executable, workers=args.workers, threads=args.threads, port=port
+    ).split()
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            if requests.get(url + "/", timeout=5).status_code == 200:
+                return process, url, stats_dir, matchup_data_df, effectiveness_scores_df
+        except requests.ConnectionError:
+            pass
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise SystemExit(f"Server didn't come up: {' '.join(command)}")
+        time.sleep(0.2)
+
+
+def run_mix(workload, clients, duration, seed):
+    # Every client picks routes from MIX at random until the time is up
+    samples = defaultdict(list)  # label -> [(latency ms, status)]
+    errors = defaultdict(int)  # label -> connection errors and exceptions
+    labels = [label for label, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    deadline = time.monotonic() + duration
+    lock = threading.Lock()
+
+    def record(label, response):
+        with lock:
+            samples[label].append((response.wall_seconds * 1000, response.status_code))
+
+    def client(i):
+        rnd = random.Random(seed * 1000 + i)
+        with TimedSession() as session:
+            while time.monotonic() < deadline:
+                label = rnd.choices(labels, weights)[0]
+                try:
+                    workload.run(label, session, rnd, record)
+                except requests.RequestException:
+                    with lock:
+                        errors[label] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, errors, time.monotonic() - started
+
+
+def calibrate(workload, stats_dir, repeat, seed):
+    # Sheets calls per request of each route, one route at a time. Background
+    # refreshes land wherever they happen to, so treat the numbers as approximate.
+    per_route = {}
+    rnd = random.Random(seed)
+    with requests.Session() as session:
+        for label, _ in MIX:
+            # A write before this route makes its first request reload; don't count that
+            workload.run(label, session, rnd, lambda *_: None)
+            before = backend_calls(stats_dir)
+            made = defaultdict(int)
+
+            def record(recorded_label, response):
+                made[recorded_label] += 1
+
+            for _ in range(repeat):
+                workload.run(label, session, rnd, record)
+            calls = backend_calls(stats_dir) - before
+            for recorded_label in made:
+                per_route[recorded_label] = calls / sum(made.values())
+    return per_route
+
+
+def summarize(samples, errors, elapsed, calls_per_request):
+    routes = {}
+    for label in sorted(set(samples) | set(errors)):
+        latencies = sorted(latency for latency, _ in samples[label])
+        routes[label] = {
+            "requests": len(latencies),
+            "errors": errors[label] + sum(1 for _, status in samples[label] if status >= 500),
+            "throughput_rps": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1] if latencies else None,
+            "backend_calls_per_request": calls_per_request.get(label),
+        }
+    return routes
+
+
+def print_report(report, baseline):
+    total = report["total"]
+    print(f"\n{total['requests']} requests in {report['elapsed_s']:.1f}s: {total['throughput_rps']:.1f} req/s, "
+          f"{total['errors']} errors, {total['backend_calls_per_request']:.2f} Sheets calls per request")
+    header = f"{'route':<32}{'reqs':>7}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'calls/req':>11}{'err':>5}"
+    print(header + (f"{'p95 before':>12}" if baseline else ""))
+    for label, route in report["routes"].items():
+        def ms(value):
+            return f"{value:.1f}" if value is not None else "-"
+        calls = route["backend_calls_per_request"]
+        line = (f"{label:<32}{route['requests']:>7}{route['throughput_rps']:>8.1f}{ms(route['p50_ms']):>9}"
+                f"{ms(route['p95_ms']):>9}{ms(route['p99_ms']):>9}{(f'{calls:.2f}' if calls is not None else '-'):>11}"
+                f"{route['errors']:>5}")
+        before = (baseline or {}).get(label)
+        if before:
+            line += f"{ms(before['p95_ms']):>12}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=2, help="{workers} in --server-command")
+    parser.add_argument("--threads", type=int, default=4, help="{threads} in --server-command")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of mixed load")
+    parser.add_argument("--cards", type=int, default=40)
+    parser.add_argument("--decks", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.15, help="emulated Sheets API latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="extra random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of Sheets calls answered with a 429")
+    parser.add_argument("--per-minute", type=int, default=0, help="emulated Sheets quota per worker (0: none)")
+    parser.add_argument("--calibrate", type=int, default=5, help="requests per route when counting Sheets calls")
+    parser.add_argument("--server-command",
+                        default="{python} -m flask --app App run --with-threads --no-reload --port {port}",
+                        help="starts the app; {python}, {workers}, {threads} and {port} are filled in")
+    parser.add_argument("--url", help="test this running server instead of starting one")
+    parser.add_argument("--stats-dir", help="SHEETS_EMULATOR_STATS of the --url server")
+    parser.add_argument("--output", default="load_report.json")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["routes"]
+
+    with tempfile.TemporaryDirectory() as scratch:
+        process = None
+        if args.url:
+            url, stats_dir = args.url.rstrip("/"), args.stats_dir
+            matchup_data_df, effectiveness_scores_df = make_tables(args.cards, args.decks, args.seed)
+        else:
+            process, url, stats_dir, matchup_data_df, effectiveness_scores_df = start_server(args, scratch)
+
+        try:
+            workload = Workload(url, matchup_data_df["Deck"].tolist(),
+                                effectiveness_scores_df["Card Name"].tolist(), args.seed)
+            calls_before = backend_calls(stats_dir) if stats_dir else None
+            samples, errors, elapsed = run_mix(workload, args.clients, args.duration, args.seed)
+            mix_calls = backend_calls(stats_dir) - calls_before if stats_dir else None
+            calls_per_request = calibrate(workload, stats_dir, args.calibrate, args.seed) if stats_dir else {}
+        finally:
+            if process is not None:
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=30)
+
+    routes = summarize(samples, errors, elapsed, calls_per_request)
+    requests_made = sum(route["requests"] for route in routes.values())
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "elapsed_s": elapsed,
+        "total": {
+            "requests": requests_made,
+            "errors": sum(route["errors"] for route in routes.values()),
+            "throughput_rps": requests_made / elapsed,
+            "backend_calls_per_request": (mix_calls / requests_made) if mix_calls is not None and requests_made else 0.0,
+        },
+        "routes": routes,
+    }
+    print_report(report, baseline)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# Time and peak memory of each stage between the Sheets download and a finished
+# sideboard, on synthetic tables from our current size up to 5000 cards x 500
+# decks. Writes a JSON report; pass an earlier one with --compare to see how a
+# change moved each number.
+#
+#   python benchmarks/pipeline_bench.py --output before.json
+#   python benchmarks/pipeline_bench.py --output after.json --compare before.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from optimizer import SIDEBOARD_SIZE, assign_sideboard_cards, refine_sideboard, solve_exact
+from snapshot import build_snapshot
+from snapshot_store import SnapshotStore
+from synthetic import make_tables
+
+
+SCALES = "40x12,200x50,1000x100,2500x250,5000x500"  # cards x decks
+
+
+def stages(matchup_data_df, effectiveness_scores_df, exact, scratch):
+    # (name, setup, run): setup's result is passed to run and isn't timed
+    matchup_records = matchup_data_df.to_dict("records")
+    effectiveness_records = effectiveness_scores_df.to_dict("records")
+    snapshot = build_snapshot(matchup_data_df, effectiveness_scores_df)
+    greedy_map = refine_sideboard(snapshot, assign_sideboard_cards(snapshot, SIDEBOARD_SIZE))
+    saved = SnapshotStore(tempfile.mkdtemp(dir=scratch))
+    saved.save(snapshot)
+
+    def fresh_snapshot():
+        return build_snapshot(matchup_data_df, effectiveness_scores_df)
+
+    def empty_store():
+        return SnapshotStore(tempfile.mkdtemp(dir=scratch)), fresh_snapshot()
+
+    result = [
+        # get_all_records() rows to DataFrames, as GoogleSheetsStorage does
+        ("records_to_frames", None,
+         lambda _: (pd.DataFrame(matchup_records), pd.DataFrame(effectiveness_records))),
+        # Everything update_data() derives from the tables
+        ("build_snapshot", None, lambda _: fresh_snapshot()),
+        ("rebuild_snapshot", None,
+         lambda _: build_snapshot(matchup_data_df, effectiveness_scores_df, previous=snapshot)),
+        # First call on a snapshot ranks every deck's cards; later calls reuse that
+        ("assign_sideboard_cards", fresh_snapshot, lambda data: assign_sideboard_cards(data, SIDEBOARD_SIZE)),
+        ("assign_sideboard_cards_warm", None, lambda _: assign_sideboard_cards(snapshot, SIDEBOARD_SIZE)),
+        ("refine_sideboard", None, lambda _: refine_sideboard(snapshot, dict(greedy_map))),
+        # Publishing to and mapping in the snapshot shared between workers
+        ("snapshot_save", empty_store, lambda target: target[0].save(target[1])),
+        ("snapshot_load", None, lambda _: saved.load()),
+    ]
+    if exact:
+        result.append(("solve_exact", None, lambda _: solve_exact(snapshot, greedy_map=greedy_map)))
+    return result
+
+
+def measure(setup, run, repeat):
+    # Wall time of each run in ms, then peak traced memory of one more run in KiB
+    # (measured separately, since tracing slows everything down)
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        run(arg)
+        times.append((time.perf_counter() - start) * 1000)
+
+    arg = setup() if setup else None
+    tracemalloc.start()
+    try:
+        run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"best_ms": min(times), "median_ms": statistics.median(times), "peak_kib": peak / 1024}
+
+
+def run_scale(n_cards, n_decks, repeat, exact, seed):
+    matchup_data_df, effectiveness_scores_df = make_tables(n_cards, n_decks, seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        for name, setup, run in stages(matchup_data_df, effectiveness_scores_df, exact, scratch):
+            # Big tables take seconds per stage; don't spend minutes on them
+            results[name] = measure(setup, run, repeat if n_cards * n_decks <= 100_000 else max(1, repeat // 5))
+    return results
+
+
+def print_scale(scale, results, baseline):
+    print(f"\n{scale} (cards x decks)")
+    print(f"{'stage':<30}{'best ms':>12}{'median ms':>12}{'peak KiB':>12}" + (f"{'vs before':>12}" if baseline else ""))
+    for name, result in results.items():
+        line = f"{name:<30}{result['best_ms']:>12.3f}{result['median_ms']:>12.3f}{result['peak_kib']:>12.0f}"
+        before = (baseline or {}).get(name)
+        if before:
+            line += f"{before['best_ms'] / result['best_ms']:>11.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", default=SCALES, help="comma-separated CARDSxDECKS sizes")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--exact", action="store_true", help="also time the exact solver (its search stops after 0.5s)")
+    parser.add_argument("--output", default="bench_report.json")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": {},
+    }
+    for scale in args.scales.split(","):
+        n_cards, n_decks = (int(n) for n in scale.lower().split("x"))
+        results = run_scale(n_cards, n_decks, args.repeat, args.exact, args.seed)
+        report["results"][scale] = results
+        print_scale(scale, results, baseline.get(scale))
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Render time per page: compiling the template source on every request (what
+# render_template_string did) against the compiled template from the registry.
+#
+#   python benchmarks/render_bench.py --cards 40 --decks 12 --repeat 200
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MATCH_QUEUE_PATH", os.path.join(tempfile.mkdtemp(), "match_queue.db"))
+
+from werkzeug.datastructures import MultiDict
+
+import App
+from optimizer import optimize_sideboard
+from snapshot import build_snapshot
+from synthetic import make_tables
+from tables import table_page
+
+
+def page_contexts(data):
+    matchup_data_df = data.matchup_data_df
+    effectiveness_scores_df = data.effectiveness_scores_df
+    deck_names = list(effectiveness_scores_df.columns[2:])
+    card_names = effectiveness_scores_df["Card Name"].tolist()
+    sideboard_map, _ = optimize_sideboard(data, "greedy", 15)
+    _, result = optimize_sideboard(data, "exact", 15)
+
+    return {
+        "home.html": {},
+        "add_card.html": {"deck_names": deck_names},
+        "add_deck.html": {"card_names": card_names},
+        "add_match.html": {"deck_names": data.deck_names},
+        "remove_deck.html": {"deck_names": deck_names},
+        "remove_card.html": {"card_names": data.card_names},
+        "view_decks.html": {"table": table_page(matchup_data_df, MultiDict()), "deck_names": list(data.deck_names)},
+        "view_cards.html": {"table": table_page(effectiveness_scores_df, MultiDict(), fixed_columns=2),
+                            "card_names": card_names, "deck_names": deck_names},
+        "sideboard.html": {"sideboard_map": sideboard_map, "result": result,
+                           "solver_status": "Optimal", "greedy_note": "optimality gap 0.0%"},
+        "sideboard_error.html": {"error": "Sheets unavailable"},
+    }
+
+
+def best_of(fn, repeat):
+    # Best of three runs, in milliseconds per call
+    runs = []
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        runs.append((time.perf_counter() - start) / repeat * 1000)
+    return min(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=40)
+    parser.add_argument("--decks", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    data = build_snapshot(*make_tables(args.cards, args.decks))
+    env = App.app.jinja_env
+
+    print(f"{args.cards} cards x {args.decks} decks, best of 3 x {args.repeat} renders")
+    print(f"{'template':<22}{'compile+render ms':>19}{'compiled ms':>13}{'speedup':>9}")
+    for name, context in page_contexts(data).items():
+        # The table pages link back to their own endpoint
+        with App.app.test_request_context("/" + name.removesuffix(".html")):
+            source = env.loader.get_source(env, name)[0]
+            template = env.get_template(name)
+            uncached = best_of(lambda: env.from_string(source).render(context), args.repeat)
+            cached = best_of(lambda: template.render(context), args.repeat)
+        print(f"{name:<22}{uncached:>19.3f}{cached:>13.3f}{uncached / cached:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
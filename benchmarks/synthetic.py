@@ -0,0 +1,30 @@
+import random
+
+import pandas as pd
+
+
+# Sheet-shaped tables with random but plausible values, for benchmarks that
+# must not touch Google Sheets. Same seed -> same tables.
+def make_tables(n_cards=40, n_decks=12, seed=0):
+    rnd = random.Random(seed)
+    deck_names = [f"Deck {i}" for i in range(n_decks)]
+    card_names = [f"Card {i}" for i in range(n_cards)]
+
+    matchup_rows = []
+    for deck_name in deck_names:
+        times_fought = rnd.randint(0, 40)
+        matchup_rows.append({
+            "Deck": deck_name,
+            "MTGO PR": round(rnd.uniform(0.005, 0.12), 4),
+            "Max Slots": rnd.randint(2, 8),
+            "# of times fought": times_fought,
+            "# of match wins": rnd.randint(0, times_fought),
+        })
+
+    effectiveness_rows = []
+    for card_name in card_names:
+        row = {"Card Name": card_name, "Max Copies": rnd.randint(1, 4)}
+        row.update({deck_name: rnd.randint(0, 10) for deck_name in deck_names})
+        effectiveness_rows.append(row)
+
+    return pd.DataFrame(matchup_rows), pd.DataFrame(effectiveness_rows)
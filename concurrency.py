@@ -0,0 +1,48 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: file locks do nothing, so shared files must have a single user
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path):
+    # Exclusive lock on the file at path (created if missing), held by at most
+    # one process on the machine at a time - gunicorn workers included
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# A background thread, thread pool or the like that each process needs its own
+# of. Threads don't survive a fork, so a gunicorn worker forked after the master
+# made one gets a fresh one from factory() the first time it calls get().
+class PerProcess:
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._value = self._factory()
+                    self._pid = os.getpid()
+        return self._value
+
+
+def start_thread(target, name):
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    thread.start()
+    return thread
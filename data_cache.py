@@ -0,0 +1,246 @@
+import threading
+import time
+
+from concurrency import PerProcess, start_thread
+
+
+RETRY_INTERVAL = 5  # Seconds between background reload attempts while storage is failing
+
+
+# One reload in progress. Readers that need data while it runs wait for its
+# result instead of starting a reload of their own.
+class _Flight:
+    def __init__(self, seq, generation, base):
+        self.seq = seq  # Start order; an older load never replaces a newer one
+        self.generation = generation  # invalidate() count when the load started
+        self.base = base  # Snapshot published when the load started
+        self.changes = []  # apply() calls made while loading, replayed onto the result
+        self.done = threading.Event()
+        self.snapshot = None
+        self.error = None
+
+
+# Holds the current DataSnapshot in memory so reads don't cost a Sheets round trip.
+# loader(version) must return a fresh DataSnapshot stamped with the given version,
+# or the one from peek() if it has nothing newer.
+#
+# Reloads are single-flight: however many requests find the cache empty or
+# invalidated at once, one load runs and the rest share its result (or its
+# error). The load runs outside the lock; the finished snapshot is published
+# with a single reference swap, so readers see either the old one or the new
+# one, never a mix.
+#
+# With refresh_interval set, a background thread reloads on that schedule and
+# swaps the new snapshot in; a request that finds the snapshot past its TTL is
+# served it anyway and only wakes the refresher (stale-while-revalidate). If a
+# reload fails, the last good snapshot keeps being served. After a write, the
+# writer waits for the reload in invalidate(); everyone else keeps reading
+# the snapshot they had until it lands.
+#
+# fallback(version), if given, returns a previously saved snapshot (or None).
+# With a refresher it is served straight away on a cold start while the first
+# real load runs in the background; without one, only when that load fails.
+class SnapshotCache:
+    def __init__(self, loader, ttl=60, refresh_interval=None, fallback=None):
+        self._loader = loader
+        self._fallback = fallback
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval  # None: reload on the request path instead
+        self.last_error = None  # Exception from the last failed reload, until one succeeds
+        self.loads = 0  # Loads started, for checking that concurrent reloads coalesce
+        self._snapshot = None
+        self._expires_at = 0.0
+        self._loaded_at = None  # When the current data was fetched from storage
+        self._invalidated = False
+        self._generation = 0
+        self._version = 0
+        self._flight = None  # The load new readers join
+        self._flights = set()  # Every load still running
+        self._published_seq = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._next_refresh = 0.0
+        self._refresher = PerProcess(lambda: start_thread(self._run, "snapshot-refresh"))
+        self._fallback_tried = False
+        self._serving_fallback = False  # Until the first load from storage succeeds
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None:
+            if self.refresh_interval is not None:
+                self._start_refresher()
+                if time.monotonic() >= self._expires_at:
+                    self._wake.set()
+                return snapshot
+            if time.monotonic() < self._expires_at:
+                return snapshot
+
+        if snapshot is None and self.refresh_interval is not None and self._use_fallback():
+            self._start_refresher()
+            self._wake.set()
+            return self._snapshot
+
+        flight = self._reload()
+        if flight is None:
+            return self._snapshot
+        if flight.error is None:
+            return flight.snapshot
+
+        if self._snapshot is None:
+            self._use_fallback()
+        with self._lock:
+            if self._snapshot is None or (self.refresh_interval is None and not self._serving_fallback):
+                raise flight.error
+            # Serve the last good snapshot and leave the retries to the refresher
+            # (or, without one, to a request after the retry interval)
+            self._invalidated = False
+            if self.refresh_interval is None:
+                self._expires_at = time.monotonic() + RETRY_INTERVAL
+            return self._snapshot
+
+    def invalidate(self):
+        # Called by write routes once the write is done. Reloads from storage
+        # before returning, even with a refresher, so whoever made the change
+        # sees it on their next page. A load already running may predate the
+        # write, so it doesn't count. If the reload fails, the snapshot expires
+        # and the next read (or the refresher) tries again.
+        with self._lock:
+            self._generation += 1
+            self._invalidated = True
+        if self._snapshot is None:
+            return  # Nothing loaded yet, so the first read loads it anyway
+        flight = self._reload(force=True)
+        if flight.error is not None:
+            with self._lock:
+                self._expires_at = 0.0
+            self._wake.set()
+
+    def apply(self, change):
+        # Publish change(snapshot, version) in place of the current snapshot without
+        # going back to storage; the expiry is unchanged. No-op before the first load.
+        # Loads still running get the same change when they finish.
+        with self._lock:
+            if self._snapshot is None:
+                return None
+            self._version += 1
+            self._snapshot = change(self._snapshot, self._version)
+            for flight in self._flights:
+                flight.changes.append(change)
+            return self._snapshot
+
+    def peek(self):
+        # Current snapshot without triggering a reload (may be None or expired)
+        return self._snapshot
+
+    def is_invalidated(self):
+        # Whether a write happened since the current snapshot was loaded
+        return self._invalidated
+
+    def age(self):
+        # Seconds since the served data was fetched from storage, None before the first load
+        loaded_at = self._loaded_at
+        return None if loaded_at is None else time.monotonic() - loaded_at
+
+    def _fresh(self):
+        return self._snapshot is not None and not self._invalidated and time.monotonic() < self._expires_at
+
+    def _reload(self, force=False):
+        # Join the load in progress or start one, and wait for it. Returns the
+        # finished _Flight, or None if the snapshot turned out to be fresh already.
+        with self._lock:
+            if not force and self._fresh():
+                return None
+            flight = self._flight
+            leader = flight is None or flight.generation != self._generation
+            if leader:
+                self.loads += 1
+                flight = self._flight = _Flight(self.loads, self._generation, self._snapshot)
+                self._flights.add(flight)
+                self._version += 1
+                version = self._version
+
+        if leader:
+            self._fly(flight, version)
+        else:
+            flight.done.wait()
+        return flight
+
+    def _fly(self, flight, version):
+        try:
+            snapshot = self._loader(version)
+            with self._lock:
+                if snapshot is flight.base and snapshot is not None:
+                    snapshot = self._snapshot  # Nothing new; apply() calls are already on it
+                else:
+                    for change in flight.changes:
+                        self._version += 1
+                        snapshot = change(snapshot, self._version)
+                if flight.seq > self._published_seq:
+                    self._publish(snapshot, flight)
+                else:
+                    snapshot = self._snapshot  # A load that started later already landed
+            flight.snapshot = snapshot
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.last_error = e
+                # Back off for the retry interval, even if the refresher polls more often
+                self._next_refresh = time.monotonic() + RETRY_INTERVAL
+        finally:
+            with self._lock:
+                self._flights.discard(flight)
+                if self._flight is flight:
+                    self._flight = None
+            flight.done.set()
+
+    def _publish(self, snapshot, flight):
+        now = time.monotonic()
+        self._snapshot = snapshot
+        self._published_seq = flight.seq
+        self._serving_fallback = False
+        # Counted from the fetch from storage, which another worker may have done
+        self._loaded_at = now - max(0.0, time.time() - snapshot.loaded_at)
+        self._expires_at = now + self.ttl
+        self._next_refresh = now + (self.refresh_interval or 0)
+        if flight.generation == self._generation:
+            self._invalidated = False  # Otherwise a write landed mid-load; load again next time
+        self.last_error = None
+
+    def _use_fallback(self):
+        # Publish the fallback snapshot, already stale, if nothing newer is loaded.
+        # Tried once per cache; returns whether there is a snapshot to serve now.
+        with self._lock:
+            if self._fallback is None or self._fallback_tried:
+                return self._snapshot is not None
+            self._fallback_tried = True
+            self._version += 1
+            version = self._version
+
+        try:
+            snapshot = self._fallback(version)
+        except Exception:
+            snapshot = None
+
+        with self._lock:
+            if snapshot is not None and self._snapshot is None:
+                now = time.monotonic()
+                self._snapshot = snapshot
+                # Its age counts from when it was originally fetched, not from now
+                self._loaded_at = now - max(0.0, time.time() - snapshot.loaded_at)
+                self._expires_at = 0.0
+                self._invalidated = False
+                self._serving_fallback = True
+            return self._snapshot is not None
+
+    def _start_refresher(self):
+        self._refresher.get()
+
+    def _run(self):
+        while True:
+            self._wake.wait(max(0.0, self._next_refresh - time.monotonic()))
+            self._wake.clear()
+            # Stale reads can bring a reload forward, but not past the retry back-off
+            now = time.monotonic()
+            if now < self._next_refresh and (now < self._expires_at or self.last_error is not None):
+                continue
+            self._reload(force=True)
@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent import futures
+
+import metrics
+from concurrency import PerProcess
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = "queued"  # queued -> running -> done or failed
+        self.result = None
+        self.error = None
+        self.finished = None  # time.monotonic() when it stopped running
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        # True once the job has finished, whether it worked or not
+        return self._done.wait(timeout)
+
+
+# Background jobs run on a small thread pool, so a slow optimizer run doesn't
+# hold the request that asked for it. Jobs are keyed by an ID the caller
+# derives from its inputs: submitting an ID that is queued, running or done
+# joins that job instead of starting another one. A failed job is started
+# again on the next submit. At most max_pending jobs wait or run at once;
+# finished ones are kept for keep_for seconds so pollers can pick them up.
+class JobQueue:
+    def __init__(self, max_workers=2, max_pending=16, keep_for=600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.keep_for = keep_for
+        self._jobs = {}  # job ID -> Job
+        self._lock = threading.Lock()
+        self._pool = PerProcess(lambda: futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="optimizer-job"))
+
+    def submit(self, job_id, compute):
+        # Returns the job for job_id, starting compute() for it if needed
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            if job is not None and job.status != "failed":
+                metrics.inc("sideboard_optimizer_jobs_total", outcome="coalesced")
+                return job
+            if sum(1 for job in self._jobs.values() if not job.done) >= self.max_pending:
+                metrics.inc("sideboard_optimizer_jobs_total", outcome="rejected")
+                raise JobQueueFull(f"{self.max_pending} optimizer jobs are already waiting; try again shortly")
+            job = self._jobs[job_id] = Job(job_id)
+            self._pool.get().submit(self._run, job, compute)
+            metrics.inc("sideboard_optimizer_jobs_total", outcome="started")
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def _run(self, job, compute):
+        job.status = "running"
+        try:
+            job.result = compute()
+            job.status = "done"
+        except Exception as e:
+            job.error = e
+            job.status = "failed"
+        finally:
+            job.finished = time.monotonic()
+            job._done.set()
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.keep_for
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.finished < cutoff]:
+            del self._jobs[job_id]
@@ -0,0 +1,191 @@
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from concurrency import PerProcess, file_lock, start_thread
+
+
+logger = logging.getLogger(__name__)
+
+
+def apply_deltas(matchup_data_df, deltas):
+    # Matchup_Data_Cloud table with queued (played, wins) deltas added to the counters
+    if not deltas:
+        return matchup_data_df
+    matchup_data_df = matchup_data_df.copy()
+    for deck_name, (played, wins) in deltas.items():
+        rows = matchup_data_df["Deck"] == deck_name
+        matchup_data_df.loc[rows, "# of times fought"] += played
+        matchup_data_df.loc[rows, "# of match wins"] += wins
+    return matchup_data_df
+
+
+def match_counters(matchup_data_df):
+    # deck name -> (# of times fought, # of match wins) from a Matchup_Data_Cloud table
+    return {
+        deck_name: (int(fought), int(wins)) for deck_name, fought, wins in zip(
+            matchup_data_df["Deck"], matchup_data_df["# of times fought"], matchup_data_df["# of match wins"])
+    }
+
+
+# Write-behind queue for match results. /add_match appends to a local SQLite
+# file and returns straight away; a background thread folds everything queued
+# into one (played, wins) delta per deck and hands them to
+# Storage.record_matches, which the Sheets backend writes with a single
+# batch_update. Rows are deleted only after that write succeeds, so a failed
+# flush or a restart just retries them later.
+#
+# A flush can also fail after storage applied the write (a crash, a read
+# timeout), and retrying it would count the same matches twice. So before each
+# write the counters it expects to leave behind go into flush_in_flight, and
+# the next flush or reload compares them with what storage holds: rows whose
+# write landed are deleted, the rest are retried.
+class MatchQueue:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS pending_matches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        deck TEXT NOT NULL,
+        match_win INTEGER NOT NULL,
+        recorded_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS flush_in_flight (
+        deck TEXT PRIMARY KEY,
+        through INTEGER NOT NULL,
+        fought_before INTEGER NOT NULL,
+        wins_before INTEGER NOT NULL,
+        fought_after INTEGER NOT NULL,
+        wins_after INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, storage, path="match_queue.db", flush_interval=10, max_batch=20):
+        self.storage = storage
+        self.path = path
+        self.flush_interval = flush_interval  # Seconds between flushes
+        self.max_batch = max_batch  # Flush early once this many matches are queued
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._flusher = PerProcess(lambda: start_thread(self._run, "match-queue-flush"))
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+        atexit.register(self._flush_at_exit)
+
+    def _connect(self):
+        # SQLite connections must not cross a fork, so they're keyed by process too
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = FULL")  # A queued match must survive a crash
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def record(self, deck_name, match_win):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO pending_matches (deck, match_win, recorded_at) VALUES (?, ?, ?)",
+                (deck_name, int(match_win), time.time()),
+            )
+            queued = conn.execute("SELECT COUNT(*) FROM pending_matches").fetchone()[0]
+        self._start_flusher()
+        if queued >= self.max_batch:
+            self._wake.set()
+
+    def pending_deltas(self, after=0):
+        # (deck -> (played, wins), id of the newest row included) for queued rows
+        # with id > after. Ids only grow, so callers pass the last id they folded in.
+        self._start_flusher()  # Rows left over from a previous run get flushed too
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT deck, COUNT(*), SUM(match_win), MAX(id) FROM pending_matches WHERE id > ? GROUP BY deck",
+            (after,),
+        ).fetchall()
+        deltas = {deck_name: (played, wins) for deck_name, played, wins, _ in rows}
+        return deltas, max([after] + [last_id for *_, last_id in rows])
+
+    @contextmanager
+    def locked(self):
+        # Held while flushing, and by reloads while they read storage and then the
+        # queue, so a flush can't land in between and get counted twice. gunicorn
+        # workers share the queue file, so this locks out the other workers too.
+        with self._lock, file_lock(self.path + ".lock"):
+            yield
+
+    def flush(self):
+        # Write everything queued so far; returns the number of matches written
+        with self.locked():
+            conn = self._connect()
+            if conn.execute("SELECT 1 FROM flush_in_flight LIMIT 1").fetchone():
+                self.settle(self.storage.match_counters())
+            through = conn.execute("SELECT MAX(id) FROM pending_matches").fetchone()[0]
+            if through is None:
+                return 0
+            rows = conn.execute(
+                "SELECT deck, COUNT(*), SUM(match_win) FROM pending_matches WHERE id <= ? GROUP BY deck",
+                (through,),
+            ).fetchall()
+            deltas = {deck_name: (played, wins) for deck_name, played, wins in rows}
+
+            def mark_in_flight(counters):
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO flush_in_flight VALUES (?, ?, ?, ?, ?, ?)",
+                        [(deck_name, through, fought, won, fought + deltas[deck_name][0], won + deltas[deck_name][1])
+                         for deck_name, (fought, won) in counters.items()],
+                    )
+
+            missing = self.storage.record_matches(deltas, before_write=mark_in_flight)
+            if missing:
+                logger.warning("Dropped queued matches for removed decks: %s", ", ".join(missing))
+
+            with conn:
+                conn.execute("DELETE FROM pending_matches WHERE id <= ?", (through,))
+                conn.execute("DELETE FROM flush_in_flight")
+            return sum(played for _, played, _ in rows)
+
+    def settle(self, counters):
+        # Resolve a flush that failed after marking its write in flight, given the
+        # counters storage holds now (deck name -> (fought, wins)). Call it with
+        # locked() held, so no other flush is running.
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT deck, through, fought_before, wins_before, fought_after, wins_after FROM flush_in_flight"
+        ).fetchall()
+        if not rows:
+            return
+        through = rows[0][1]
+        present = [row for row in rows if row[0] in counters]
+
+        # The write is one batch_update, so it landed for every deck or for none
+        written = not present or any(counters[deck_name] != (fought, won) for deck_name, _, fought, won, _, _ in present)
+        if written and any(counters[deck_name] != (fought, won) for deck_name, _, _, _, fought, won in present):
+            logger.warning("Match counters changed since an interrupted flush; assuming it was written: %s",
+                           ", ".join(row[0] for row in present))
+        with conn:
+            if written:
+                conn.execute("DELETE FROM pending_matches WHERE id <= ?", (through,))
+            conn.execute("DELETE FROM flush_in_flight")
+
+    def _start_flusher(self):
+        self._flusher.get()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Match queue flush failed; will retry")
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Match queue flush at exit failed; matches stay queued in %s", self.path)
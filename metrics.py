@@ -0,0 +1,139 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+# Upper bounds in seconds, from a cached-page render up to a slow Sheets call
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+ENABLED = os.getenv("METRICS", "1") != "0"
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# Counters and histograms for this process, kept as plain numbers under one
+# lock. Recording is a dict lookup and an add; the Prometheus text is only
+# put together when /metrics is scraped. Each gunicorn worker has its own.
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}  # name -> (type, help text)
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> _Histogram
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+
+        lines = []
+        for name, (kind, text) in sorted(self._help.items()):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            else:
+                for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(BUCKETS + (float("inf"),), counts):
+                        cumulative += bucket_count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = Registry()
+REGISTRY.describe("sideboard_stage_seconds", "histogram", "Time spent in each stage of loading data and serving pages.")
+REGISTRY.describe("sideboard_render_seconds", "histogram", "Template render time, by template (streamed pages include sending).")
+REGISTRY.describe("sideboard_sheets_api_calls_total", "counter", "Google Sheets API calls, by gspread method.")
+REGISTRY.describe("sideboard_sheets_api_seconds", "histogram", "Google Sheets API call time, by gspread method.")
+REGISTRY.describe("sideboard_sheets_api_retries_total", "counter", "Sheets API calls retried after a 429.")
+REGISTRY.describe("sideboard_refine_iterations_total", "counter", "Iterations run by refine_sideboard.")
+REGISTRY.describe("sideboard_refine_runs_total", "counter", "refine_sideboard runs, by why they stopped.")
+REGISTRY.describe("sideboard_result_cache_lookups_total", "counter", "Result cache lookups, by cache and hit or miss.")
+REGISTRY.describe("sideboard_result_cache_evictions_total", "counter", "Entries dropped from a full result cache, by cache.")
+REGISTRY.describe("sideboard_optimizer_jobs_total", "counter", "Optimizer job submissions, by whether they started, joined or were turned away.")
+
+
+def inc(name, amount=1, **labels):
+    if ENABLED:
+        REGISTRY.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    if ENABLED:
+        REGISTRY.observe(name, value, **labels)
+
+
+@contextmanager
+def span(stage):
+    # Times the block into sideboard_stage_seconds{stage=...}, errors included
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe("sideboard_stage_seconds", time.perf_counter() - start, stage=stage)
+
+
+def timed(stage):
+    # Decorator form of span()
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def render():
+    return REGISTRY.render()
@@ -0,0 +1,408 @@
+from dataclasses import dataclass
+import time
+
+import numpy as np
+
+import metrics
+
+
+SIDEBOARD_SIZE = 15
+
+# A=2B based on expected sideboard effectiveness on tournament winrate
+A = 2/3
+B = 1/3
+
+
+def deck_priority(data, a=A, b=B):
+    return (data.adjusted_playrate * a) + ((0.50 - data.adjusted_winrate) * b)
+
+
+@metrics.timed("assign_sideboard_cards")
+def assign_sideboard_cards(data, remaining_slots, a=A, b=B):
+    matrix = data.score_matrix
+    card_names = matrix.card_names
+    max_copies = matrix.max_copies.tolist()
+    max_slots = data.max_slots.tolist()
+    sideboard_map = {}
+
+    # Higher priority scores first, ties kept in sheet order
+    sorted_decks = np.argsort(-deck_priority(data, a, b), kind="stable")
+
+    for deck_idx in sorted_decks.tolist():
+        if remaining_slots <= 0:
+            break
+
+        for card_idx in matrix.ranked_cards(deck_idx).tolist():
+            if remaining_slots <= 0:
+                break
+
+            max_allowed = min(4, remaining_slots, max_copies[card_idx])
+            num_copies = min(max_allowed, max_slots[deck_idx])
+
+            if num_copies > 0:
+                sideboard_map[card_names[card_idx]] = num_copies
+                remaining_slots -= num_copies
+
+    return sideboard_map
+
+
+@metrics.timed("refine_sideboard")
+def refine_sideboard(data, sideboard_map, sideboard_size=SIDEBOARD_SIZE):
+    matrix = data.score_matrix
+    scores = matrix.scores
+    effective = matrix.effective
+    max_slots = data.max_slots
+    max_iterations = 100  # Failsafe to avoid infinite loops
+    absent = np.iinfo(np.int64).max
+
+    # The sideboard is a copies-per-card vector. order[] remembers when each card
+    # entered the sideboard, which is the order the dict version iterated in, so
+    # ties and the final card order come out exactly as before.
+    counts = np.zeros(len(matrix.card_names), dtype=np.int64)
+    order = np.full(len(matrix.card_names), absent, dtype=np.int64)
+    for position, (card, copies) in enumerate(sideboard_map.items()):
+        card_idx = matrix.card_index[card]
+        counts[card_idx] = copies
+        order[card_idx] = position
+    next_position = len(sideboard_map)
+
+    penalty_tracker = np.zeros(len(matrix.card_names), dtype=np.int64)
+    impact_bonus = matrix.impact_counts * 3
+    dead_cards = matrix.impact_counts <= 2  # Cards that are only useful in <=2 matchups
+    seen_sideboards = set()
+
+    for iteration in range(max_iterations):
+        sideboard_key = counts.tobytes()
+        if sideboard_key in seen_sideboards:
+            outcome = "cycle"  # Back to a sideboard already seen: converged (or cycling)
+            break
+        seen_sideboards.add(sideboard_key)
+
+        in_sideboard = counts > 0
+        boardable_per_matchup = counts @ effective
+
+        # Trim the least effective boardable cards from every over-full matchup
+        removals = []
+        for deck_idx in np.flatnonzero(boardable_per_matchup > max_slots).tolist():
+            excess = int(boardable_per_matchup[deck_idx] - max_slots[deck_idx])
+            candidates = np.flatnonzero(in_sideboard & effective[:, deck_idx])
+            ranked = candidates[np.lexsort((order[candidates], scores[candidates, deck_idx]))]
+            removals.append(ranked[:max(1, excess // 3)])  # Slower removal to prevent over-trimming
+
+        if removals:
+            hits = np.bincount(np.concatenate(removals), minlength=len(counts))
+            removed = np.minimum(hits, counts)
+            counts -= removed
+            penalty_tracker += removed
+
+        # Drop dead cards (low impact across matchups)
+        counts[in_sideboard & dead_cards] = 0
+        order[counts == 0] = absent
+
+        # Ensure sideboard refills after removals
+        remaining_slots = sideboard_size - int(counts.sum())
+        if remaining_slots > 0:
+            refill_score = (matrix.totals - penalty_tracker) + impact_bonus
+            refill_order = np.argsort(-refill_score, kind="stable")
+            eligible = (counts == 0) | (counts < matrix.max_copies)
+            additions = refill_order[eligible[refill_order]][:remaining_slots]
+
+            new_cards = additions[counts[additions] == 0]
+            order[new_cards] = np.arange(next_position, next_position + len(new_cards))
+            next_position += len(new_cards)
+            counts[additions] += 1
+    else:
+        iteration, outcome = max_iterations, "max_iterations"
+    metrics.inc("sideboard_refine_iterations_total", iteration)
+    metrics.inc("sideboard_refine_runs_total", outcome=outcome)
+
+    present = np.flatnonzero(counts > 0)
+    present = present[np.argsort(order[present], kind="stable")]
+    return {matrix.card_names[card_idx]: int(counts[card_idx]) for card_idx in present.tolist()}
+
+
+MODES = ("greedy", "exact")
+
+
+def optimize_sideboard(data, mode="greedy", sideboard_size=SIDEBOARD_SIZE, a=A, b=B):
+    # Returns (sideboard_map, ExactResult or None)
+    if mode not in MODES:
+        raise ValueError(f"Unknown optimizer mode '{mode}'. Use 'greedy' or 'exact'.")
+
+    sideboard_map = assign_sideboard_cards(data, sideboard_size, a, b)
+    sideboard_map = refine_sideboard(data, sideboard_map, sideboard_size)
+    if mode == "greedy":
+        return sideboard_map, None
+
+    result = solve_exact(data, sideboard_size, greedy_map=sideboard_map, a=a, b=b)
+    return result.sideboard_map, result
+
+
+def result_key(data, mode="greedy", sideboard_size=SIDEBOARD_SIZE, a=A, b=B):
+    return (data.content_hash, mode, sideboard_size, a, b)
+
+
+# === Exact solver ===
+# Maximizes the priority-weighted effectiveness of the sideboard:
+#   sum over cards of copies * sum over decks the card is boardable against of priority * score
+# subject to at most sideboard_size cards, at most min(4, Max Copies) copies of a card,
+# and at most Max Slots boardable copies against each deck.
+@dataclass(frozen=True)
+class ExactResult:
+    sideboard_map: dict
+    objective: float
+    upper_bound: float  # Equals objective when the search finished
+    optimal: bool  # False when the time or node budget ran out first
+    nodes: int
+    greedy_objective: float
+    greedy_feasible: bool  # Whether the greedy sideboard respects every deck's Max Slots
+    gap: float | None  # (objective - greedy_objective) / objective; None when the greedy sideboard is infeasible
+
+
+def card_values(data, a=A, b=B):
+    matrix = data.score_matrix
+    return (matrix.scores * matrix.effective) @ deck_priority(data, a, b)
+
+
+def sideboard_value(data, sideboard_map, values=None):
+    if values is None:
+        values = card_values(data)
+    card_index = data.score_matrix.card_index
+    return float(sum(copies * values[card_index[card]] for card, copies in sideboard_map.items()))
+
+
+def sideboard_feasible(data, sideboard_map):
+    matrix = data.score_matrix
+    counts = np.zeros(len(matrix.card_names), dtype=np.int64)
+    for card, copies in sideboard_map.items():
+        counts[matrix.card_index[card]] = copies
+    return bool(np.all(counts @ matrix.effective <= data.max_slots))
+
+
+def _lagrange_multipliers(values, effective, copy_limits, deck_caps, slots, iterations=300):
+    # Subgradient search for deck-cap prices that make the Lagrangian bound tight.
+    # Any non-negative prices give a valid bound; better prices just prune more.
+    prices = np.zeros(len(deck_caps))
+    best_prices, best_bound = prices, np.inf
+    step = max(float(values.max(initial=0.0)), 1.0) / 2
+
+    for iteration in range(iterations):
+        reduced = values - effective @ prices
+        taken = np.zeros(len(values))
+        remaining = slots
+        for card_idx in np.argsort(-reduced, kind="stable").tolist():
+            if remaining <= 0 or reduced[card_idx] <= 0:
+                break
+            taken[card_idx] = min(copy_limits[card_idx], remaining)
+            remaining -= taken[card_idx]
+
+        bound = prices @ deck_caps + taken @ reduced
+        if bound < best_bound:
+            best_prices, best_bound = prices, bound
+
+        subgradient = deck_caps - taken @ effective
+        if not np.any(subgradient):
+            break
+        prices = np.maximum(0.0, prices - step * subgradient / np.linalg.norm(subgradient))
+        step *= 0.98
+
+    return best_prices
+
+
+# Nodes with at least this many free slots get their deck caps re-priced
+REPRICE_MIN_SLOTS = 4
+REPRICE_ITERATIONS = 20
+
+
+def _fill(reduced, copy_limits, slots):
+    # Copies per card that maximize net value with at most slots copies in all,
+    # ignoring the deck caps: best net value first, positive values only
+    order = np.argsort(-reduced, kind="stable")
+    limits = np.where(reduced[order] > 0, copy_limits[order], 0)
+    taken = np.empty(len(reduced))
+    taken[order] = np.clip(slots - (np.cumsum(limits) - limits), 0, limits)
+    return taken
+
+
+def _lagrangian_bound(values, effective, copy_limits, deck_caps, slots, prices, target, iterations):
+    # Re-prices the deck caps for a subproblem, starting from prices, and stops as
+    # soon as the bound drops to target (the subproblem can't beat it). Steps are
+    # Polyak steps towards target, lengthened because target sits below the best
+    # bound the prices can reach. Returns the best bound found and its prices.
+    best_bound, best_prices = np.inf, prices
+    for iteration in range(iterations):
+        reduced = values - effective @ prices
+        taken = _fill(reduced, copy_limits, slots)
+        bound = float(prices @ deck_caps + taken @ reduced)
+        if bound < best_bound:
+            best_bound, best_prices = bound, prices
+        if best_bound <= target:
+            break
+        subgradient = deck_caps - taken @ effective
+        norm = float(subgradient @ subgradient)
+        if norm == 0:
+            break
+        prices = np.maximum(0.0, prices - 4 * (bound - target) / norm * subgradient)
+    return best_bound, best_prices
+
+
+@metrics.timed("solve_exact")
+def solve_exact(data, sideboard_size=SIDEBOARD_SIZE, greedy_map=None, a=A, b=B, time_limit=0.5, node_limit=2_000_000):
+    matrix = data.score_matrix
+    values = card_values(data, a, b)
+    deck_caps = np.maximum(data.max_slots.astype(np.int64), 0)
+
+    # No card can take more copies than its tightest deck allows
+    tightest_deck = np.where(matrix.effective, deck_caps[np.newaxis, :], sideboard_size).min(axis=1, initial=sideboard_size)
+    copy_limits = np.minimum.reduce([matrix.max_copies, np.full(len(values), 4), tightest_deck])
+    copy_limits = np.clip(copy_limits, 0, sideboard_size)
+
+    # Price each deck's slots, then search cards by their value net of those prices.
+    # Bound at a node = value so far + priced remaining deck slots + the best
+    # remaining net-value copies; taking a copy moves its price from the second
+    # term into the first, so the bound never under-estimates.
+    effective = matrix.effective.astype(np.float64)
+    prices = _lagrange_multipliers(values, effective, copy_limits, deck_caps, sideboard_size)
+    reduced = values - effective @ prices
+
+    # Only cards that add value can be in an optimal sideboard
+    items = [
+        card_idx for card_idx in np.argsort(-reduced, kind="stable").tolist()
+        if values[card_idx] > 0 and copy_limits[card_idx] > 0
+    ]
+    item_values = [float(values[card_idx]) for card_idx in items]
+    item_limits = [int(copy_limits[card_idx]) for card_idx in items]
+    item_decks = [np.flatnonzero(matrix.effective[card_idx]).tolist() for card_idx in items]
+    item_prices = [float(prices[decks].sum()) for decks in item_decks]
+
+    item_reduced = [float(reduced[card_idx]) for card_idx in items]
+
+    # blocked[j] counts item j's decks with no free slots left, so full decks
+    # rule items out without scanning their deck lists
+    deck_items = [[] for _ in range(len(deck_caps))]
+    for j, decks in enumerate(item_decks):
+        for d in decks:
+            deck_items[d].append(j)
+    blocked = [sum(1 for d in decks if deck_caps[d] == 0) for decks in item_decks]
+
+    def bound(i, slots):
+        # Best net value of filling slots from items i on, ignoring the deck caps
+        # except that no item takes more copies than its fullest deck has room
+        # for. Items are sorted by net value, so taking them in order is optimal,
+        # and the bound never grows as i moves down the list.
+        total = 0.0
+        for j in range(i, len(items)):
+            if slots == 0 or item_reduced[j] <= 0:
+                break
+            if blocked[j]:
+                continue
+            k = min(item_limits[j], slots, min((deck_caps[d] for d in item_decks[j]), default=slots))
+            total += k * item_reduced[j]
+            slots -= k
+        return total
+
+    def take(decks, k):
+        for d in decks:
+            deck_caps[d] -= k
+            if deck_caps[d] == 0:
+                for t in deck_items[d]:
+                    blocked[t] += 1
+
+    def give_back(decks, k):
+        for d in decks:
+            if deck_caps[d] == 0:
+                for t in deck_items[d]:
+                    blocked[t] -= 1
+            deck_caps[d] += k
+
+    deck_caps = deck_caps.tolist()
+    priced_slots = float(prices @ deck_caps)
+    chosen = []
+    best = {"value": 0.0, "choice": []}
+    # open_bound: the highest bound among the branches left unexplored when the
+    # budget ran out, which caps anything they could still have found
+    search_state = {"nodes": 0, "exhausted": False, "open_bound": 0.0}
+    deadline = time.perf_counter() + time_limit
+
+    def out_of_budget():
+        nodes = search_state["nodes"]
+        if nodes >= node_limit or time.perf_counter() > deadline:
+            search_state["exhausted"] = True
+        return search_state["exhausted"]
+
+    item_value_array = np.array(item_values)
+    item_limit_array = np.array(item_limits)
+    item_effective = matrix.effective[items]
+    item_weights = item_effective.astype(np.float64)
+
+    def repriced_bound(j, slots, value, prices, iterations):
+        # Lagrangian bound on the best sideboard that adds items j on to this
+        # node, with the deck caps re-priced for what is left of them
+        caps = np.array(deck_caps, dtype=np.float64)
+        room = np.where(item_effective[j:], caps, slots).min(axis=1, initial=slots)
+        limits = np.minimum(item_limit_array[j:], room)
+        bound, prices = _lagrangian_bound(item_value_array[j:], item_weights[j:], limits, caps, slots,
+                                          prices, best["value"] - value, iterations)
+        return value + bound, prices
+
+    def search(i, slots, value, priced_slots, prices):
+        search_state["nodes"] += 1
+        if value > best["value"]:
+            best["value"], best["choice"] = value, list(chosen)
+        if slots == 0:
+            return
+
+        for j in range(i, len(items)):
+            if blocked[j]:
+                continue
+            node_bound = value + priced_slots + bound(j, slots)
+            if node_bound <= best["value"] + 1e-9:
+                break  # Bounds only shrink further down the list
+            if slots >= REPRICE_MIN_SLOTS:
+                # The root prices fit this node's caps less and less further down;
+                # prices fitted to them often prove nothing from j on can win
+                node_bound, prices = repriced_bound(j, slots, value, prices, REPRICE_ITERATIONS)
+                if node_bound <= best["value"] + 1e-9:
+                    break
+
+            decks = item_decks[j]
+            copies = min(item_limits[j], slots, min((deck_caps[d] for d in decks), default=slots))
+            for k in range(copies, 0, -1):
+                take(decks, k)
+                chosen.append((j, k))
+                search(j + 1, slots - k, value + k * item_values[j], priced_slots - k * item_prices[j], prices)
+                chosen.pop()
+                give_back(decks, k)
+                if out_of_budget():
+                    # Fewer copies of j and everything after it are left open
+                    open_bound = min(node_bound, repriced_bound(j, slots, value, prices, 50)[0])
+                    search_state["open_bound"] = max(search_state["open_bound"], open_bound)
+                    return
+
+    search(0, sideboard_size, 0.0, priced_slots, prices)
+
+    objective = best["value"]
+    optimal = not search_state["exhausted"]
+    upper_bound = objective if optimal else max(objective, search_state["open_bound"])
+
+    sideboard_map = {matrix.card_names[items[j]]: k for j, k in best["choice"]}
+    if greedy_map is None:
+        greedy_map = refine_sideboard(data, assign_sideboard_cards(data, sideboard_size, a, b), sideboard_size)
+    greedy_objective = sideboard_value(data, greedy_map, values)
+    greedy_feasible = sideboard_feasible(data, greedy_map)
+    # An infeasible greedy sideboard can outscore the optimum, so there is no gap to report
+    if not greedy_feasible:
+        gap = None
+    else:
+        gap = (objective - greedy_objective) / objective if objective > 0 else 0.0
+
+    return ExactResult(
+        sideboard_map=sideboard_map,
+        objective=objective,
+        upper_bound=upper_bound,
+        optimal=optimal,
+        nodes=search_state["nodes"],
+        greedy_objective=greedy_objective,
+        greedy_feasible=greedy_feasible,
+        gap=gap,
+    )
@@ -0,0 +1,158 @@
+import cProfile
+import hmac
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import abort, g, request, send_from_directory
+
+
+FORMATS = ("collapsed", "pstats")
+
+# Background threads a request may wait on, by name prefix (thread pools add _<n>)
+HELPER_THREADS = ("sheets-fetch", "snapshot-refresh", "optimizer-job")
+
+
+# Samples the stack of the request's thread every interval seconds, plus the
+# helper threads it may be waiting on (Sheets fetches, the snapshot refresher,
+# optimizer jobs); other requests being served meanwhile stay out of it.
+# Output is one "thread;outer;...;inner count" line per stack, which
+# flamegraph.pl, speedscope and inferno read directly.
+class StackSampler:
+    def __init__(self, interval=0.001, thread_id=None, helpers=HELPER_THREADS):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.helpers = helpers
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != self.thread_id and not names.get(thread_id, "").startswith(self.helpers):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# cProfile around the request's own thread; the .pstats file loads into
+# pstats, snakeviz or gprof2dot
+class DeterministicProfiler:
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def dump(self, path):
+        self._profile.dump_stats(path)
+
+
+# Profiles single requests on demand. A request is profiled when it carries the
+# admin token in an X-Profile header (never in the URL, where it would end up
+# in access logs and browser history); X-Profile-Format picks collapsed
+# (sampled, default) or pstats. The dump is saved in directory and named in the
+# response's X-Profile header, and can be fetched from /profiles/<name> with
+# the same header. One request per process is profiled at a time; others that
+# ask meanwhile get X-Profile: busy.
+class RequestProfiler:
+    def __init__(self, token, directory="profiles", interval=0.001):
+        self.token = token
+        self.directory = directory
+        self.interval = interval
+        self._busy = threading.Lock()
+
+    def install(self, app):
+        if not self.token:
+            return  # No token configured: profiling is off and the routes don't exist
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        app.add_url_rule("/profiles/<name>", "profile_download", self._download)
+
+    def _authorized(self):
+        given = request.headers.get("X-Profile", "")
+        return hmac.compare_digest(given.encode(), self.token.encode())
+
+    def _start(self):
+        if request.endpoint == "profile_download":
+            return
+        if "X-Profile" not in request.headers or not self._authorized():
+            return
+        profile_format = request.headers.get("X-Profile-Format", "collapsed")
+        if profile_format not in FORMATS:
+            abort(400, f"Unknown profile format '{profile_format}'. Use one of: {', '.join(FORMATS)}.")
+        if not self._busy.acquire(blocking=False):
+            g.profile_busy = True
+            return
+
+        profiler = StackSampler(self.interval, threading.get_ident()) if profile_format == "collapsed" else DeterministicProfiler()
+        extension = "collapsed" if profile_format == "collapsed" else "pstats"
+        endpoint = re.sub(r"[^A-Za-z0-9_]", "_", request.endpoint or "unknown")
+        g.profile_name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{endpoint}-{secrets.token_hex(3)}.{extension}"
+        g.profile_stop = self._stopper(profiler, g.profile_name)
+        profiler.start()
+
+    def _stopper(self, profiler, name):
+        # Stops the profiler and saves its dump, once
+        done = []
+
+        def stop():
+            if done:
+                return
+            done.append(True)
+            try:
+                profiler.stop()
+                os.makedirs(self.directory, exist_ok=True)
+                profiler.dump(os.path.join(self.directory, name))
+            finally:
+                self._busy.release()
+        return stop
+
+    def _finish(self, response):
+        if g.get("profile_busy"):
+            response.headers["X-Profile"] = "busy"
+        stop = g.get("profile_stop")
+        if stop is not None:
+            # Streamed pages render while the body is sent, so stop once it's out
+            response.headers["X-Profile"] = g.profile_name
+            response.call_on_close(stop)
+        return response
+
+    def _teardown(self, exc):
+        # after_request doesn't run when the view raised
+        stop = g.get("profile_stop")
+        if exc is not None and stop is not None:
+            stop()
+
+    def _download(self, name):
+        if not self._authorized():
+            abort(404)
+        return send_from_directory(os.path.abspath(self.directory), name, as_attachment=True)
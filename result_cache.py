@@ -0,0 +1,42 @@
+from collections import OrderedDict
+import threading
+
+import metrics
+
+
+# LRU memo for optimizer results. Keys include the snapshot's content hash, so a
+# reload that changes nothing the optimizer reads keeps serving the same entries.
+# Hits, misses and evictions are counted in the metrics registry under name.
+class ResultCache:
+    def __init__(self, name, max_entries=64):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            hit = key in self._entries
+            if hit:
+                self._entries.move_to_end(key)
+                value = self._entries[key]
+        metrics.inc("sideboard_result_cache_lookups_total", cache=self.name, outcome="hit" if hit else "miss")
+        if hit:
+            return value
+
+        # Compute outside the lock so one slow solve doesn't block cached reads
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            evicted = max(0, len(self._entries) - self.max_entries)
+            for _ in range(evicted):
+                self._entries.popitem(last=False)
+        if evicted:
+            metrics.inc("sideboard_result_cache_evictions_total", evicted, cache=self.name)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,128 @@
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+
+EFFECTIVE_SCORE = 5  # A card is boardable against a deck when its score is above this
+
+
+def _compact(values):
+    # Scores are 0-10 in practice, so int8 is enough; fall back for anything unusual
+    if values.size == 0 or not np.all(np.mod(values, 1) == 0):
+        return values.astype(np.float64)
+    if values.min() >= np.iinfo(np.int8).min and values.max() <= np.iinfo(np.int8).max:
+        return values.astype(np.int8)
+    return values.astype(np.int32)
+
+
+def frozen(array):
+    array.flags.writeable = False
+    return array
+
+
+# Dense cards x decks view of Effectiveness_Scores_Cloud. Columns follow the deck
+# order of Matchup_Data_Cloud; a deck missing from the scores sheet scores 0.
+class ScoreMatrix:
+    def __init__(self, card_names, deck_names, scores, max_copies, totals, previous=None):
+        self.card_names = tuple(card_names)
+        self.deck_names = tuple(deck_names)
+        self.card_index = MappingProxyType({card: i for i, card in enumerate(self.card_names)})
+        self.deck_index = MappingProxyType({deck: i for i, deck in enumerate(self.deck_names)})
+
+        self.scores = frozen(scores)
+        self.effective = frozen(scores > EFFECTIVE_SCORE)
+        self.impact_counts = frozen(self.effective.sum(axis=1))  # Decks each card is boardable against
+        self.max_copies = frozen(max_copies)
+        # Sum of every value in the card's row after its name, "Max Copies" and
+        # decks without matchup data included - the optimizer's refill ranking uses it
+        self.totals = frozen(totals)
+
+        # Per-deck card rankings, built on first use and then shared by every
+        # optimizer call on this snapshot. Rankings from the previous snapshot
+        # are patched rather than rebuilt when only a few cards changed.
+        self._rankings = {}
+        if previous is not None:
+            self._carry_rankings(previous)
+
+    @classmethod
+    def from_dataframe(cls, effectiveness_scores_df, deck_names, previous=None):
+        card_names = effectiveness_scores_df.iloc[:, 0].tolist()  # Assuming first column is the card name
+        row_values = effectiveness_scores_df.iloc[:, 1:].apply(pd.to_numeric, errors="coerce").fillna(0)
+
+        if "Max Copies" in effectiveness_scores_df.columns:
+            max_copies = effectiveness_scores_df["Max Copies"].fillna(4).astype(int).to_numpy()
+        else:
+            max_copies = np.full(len(card_names), 4)
+
+        deck_values = row_values.reindex(columns=list(deck_names), fill_value=0).to_numpy()
+        scores = _compact(deck_values.reshape(len(card_names), len(deck_names)))
+        totals = row_values.to_numpy().sum(axis=1)
+        if totals.dtype == object:
+            # Without cards every column stays object, and so would the sums
+            totals = totals.astype(np.float64)
+        return cls(card_names, deck_names, scores, max_copies, totals, previous)
+
+    @property
+    def shape(self):
+        return self.scores.shape
+
+    def score(self, card, deck):
+        return self.scores[self.card_index[card], self.deck_index[deck]]
+
+    def ranked_cards(self, deck_idx):
+        # Card indices by descending score for one deck, ties kept in sheet order
+        ranking = self._rankings.get(deck_idx)
+        if ranking is None:
+            if self._integer_scores:
+                ranking = np.argsort(self._rank_keys(deck_idx))
+            else:
+                ranking = np.argsort(-self.scores[:, deck_idx], kind="stable")
+            ranking = frozen(ranking.astype(np.int32))
+            self._rankings[deck_idx] = ranking
+        return ranking
+
+    @property
+    def _integer_scores(self):
+        return np.issubdtype(self.scores.dtype, np.integer)
+
+    def _rank_keys(self, deck_idx, card_idx=None):
+        # Unique sort key per card: score descending, then sheet order
+        if card_idx is None:
+            card_idx = np.arange(len(self.card_names))
+        return -self.scores[card_idx, deck_idx].astype(np.int64) * len(self.card_names) + card_idx
+
+    def _carry_rankings(self, previous):
+        if not (self._integer_scores and previous._integer_scores and previous._rankings):
+            return
+        if len(set(self.card_names)) != len(self.card_names):
+            return
+
+        # Map the previous card positions onto this matrix; rankings only carry
+        # over if the surviving cards kept their relative sheet order
+        old_to_new = np.array([self.card_index.get(card, -1) for card in previous.card_names], dtype=np.int64)
+        surviving = old_to_new[old_to_new >= 0]
+        if np.any(np.diff(surviving) <= 0):
+            return
+
+        for old_deck_idx, old_ranking in list(previous._rankings.items()):
+            deck_idx = self.deck_index.get(previous.deck_names[old_deck_idx])
+            if deck_idx is None:
+                continue
+
+            # Keep cards whose score for this deck is unchanged, re-insert the rest
+            new_positions = old_to_new[old_ranking]
+            kept = old_ranking[new_positions >= 0]
+            new_positions = new_positions[new_positions >= 0]
+            unchanged = self.scores[new_positions, deck_idx] == previous.scores[kept, old_deck_idx]
+            kept = new_positions[unchanged]
+
+            changed = np.ones(len(self.card_names), dtype=bool)
+            changed[kept] = False
+            changed = np.flatnonzero(changed)
+            changed_keys = self._rank_keys(deck_idx, changed)
+            order = np.argsort(changed_keys)
+
+            insert_at = np.searchsorted(self._rank_keys(deck_idx, kept), changed_keys[order])
+            ranking = np.insert(kept, insert_at, changed[order])
+            self._rankings[deck_idx] = frozen(ranking.astype(np.int32))
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+
+import gspread
+from oauth2client.service_account import ServiceAccountCredentials
+from requests.adapters import HTTPAdapter
+
+import metrics
+from sheets_emulator import emulator_from_env
+from sheets_quota import WRITE
+
+
+# One authorized gspread client per worker process, plus the opened
+# Spreadsheet/Worksheet handles, so requests skip the OAuth handshake and the
+# open-by-name lookups. The client's session is a keep-alive requests.Session
+# (google-auth's AuthorizedSession), which refreshes the access token only
+# when it has expired. With SHEETS_EMULATOR set, the client is an offline
+# EmulatedClient instead (see sheets_emulator.py).
+class SheetsClientManager:
+    def __init__(self, credentials_env="GOOGLE_SHEETS_CREDENTIALS", pool_size=10, timeout=None):
+        self.credentials_env = credentials_env
+        self.pool_size = pool_size
+        self.timeout = timeout  # Seconds any one HTTP request may take; None waits forever
+        self._lock = threading.RLock()
+        self._pid = None
+        self._client = None
+        self._spreadsheets = {}
+        self._worksheets = {}
+
+    def client(self):
+        with self._lock:
+            # gunicorn may fork workers after import, so never share a client across processes
+            if self._client is None or self._pid != os.getpid():
+                self._connect()
+            return self._client
+
+    def spreadsheet(self, name, quota=None, priority=WRITE, deadline=None):
+        with self._lock:
+            client = self.client()
+            if name not in self._spreadsheets:
+                with metrics.span("sheets_open"):
+                    self._spreadsheets[name] = self._call(quota, priority, client.open, name, deadline=deadline)
+            return self._spreadsheets[name]
+
+    def worksheet(self, name, quota=None, priority=WRITE, deadline=None):
+        # First worksheet of the named spreadsheet (what the app calls sheet1)
+        with self._lock:
+            spreadsheet = self.spreadsheet(name, quota, priority, deadline)
+            if name not in self._worksheets:
+                def sheet1():
+                    return spreadsheet.sheet1
+                with metrics.span("sheets_open"):
+                    self._worksheets[name] = self._call(quota, priority, sheet1, deadline=deadline)
+            return self._worksheets[name]
+
+    def _call(self, quota, priority, fn, *args, deadline=None):
+        # Opening a handle is an API call too; through a QuotaClient it counts
+        # against the budget and 429s are retried like any other call
+        if quota is None:
+            metrics.inc("sideboard_sheets_api_calls_total", method=fn.__name__)
+            return fn(*args)
+        return quota.call(fn, *args, priority=priority, deadline=deadline)  # Counts the call itself
+
+    def reset(self):
+        # Drop the client and handles, e.g. after a sheet was renamed or auth was revoked
+        with self._lock:
+            self._client = None
+            self._spreadsheets = {}
+            self._worksheets = {}
+
+    def _connect(self):
+        if os.getenv("SHEETS_EMULATOR"):
+            self._client = emulator_from_env()
+            self._pid = os.getpid()
+            self._spreadsheets = {}
+            self._worksheets = {}
+            return
+
+        google_creds_json = os.getenv(self.credentials_env)
+        if google_creds_json:
+            google_creds_dict = json.loads(google_creds_json)
+            creds = ServiceAccountCredentials.from_json_keyfile_dict(google_creds_dict)
+        else:
+            raise ValueError("Google Sheets credentials not found in environment variables.")
+
+        with metrics.span("sheets_auth"):
+            client = gspread.authorize(creds)
+
+        # Size the keep-alive pool for gunicorn threads sharing this client
+        session = getattr(client, "http_client", client).session
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        client.set_timeout(self.timeout)
+
+        self._client = client
+        self._pid = os.getpid()
+        self._spreadsheets = {}
+        self._worksheets = {}
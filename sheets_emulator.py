@@ -0,0 +1,298 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from gspread.cell import Cell
+from gspread.exceptions import APIError, SpreadsheetNotFound
+from gspread.utils import a1_range_to_grid_range, numericise_all
+from requests import Response
+
+from concurrency import PerProcess, file_lock
+
+
+# In-memory stand-in for the slice of gspread the app uses, so load tests and
+# benchmarks can run without a network or touching the real spreadsheets.
+# Every API call sleeps latency plus up to jitter seconds and can fail with a
+# 429, either at random (error_rate) or once more than per_minute calls were
+# made in the last minute, like the real per-user quota. open() and sheet1
+# only fail on the quota: the app looks them up once per process.
+#
+# Each spreadsheet has a single worksheet, held as rows of strings the way
+# Sheets returns them. With path set, the JSON file there is the backend:
+# writes go back to it and every process using it sees them, as gunicorn
+# workers sharing the real spreadsheets would. Set SHEETS_EMULATOR to such a
+# file ({"Spreadsheet name": [[header...], [row...]], ...}) to have
+# SheetsClientManager hand out an emulator instead of a gspread client.
+class EmulatedClient:
+    def __init__(self, spreadsheets, latency=0.0, jitter=0.0, error_rate=0.0, per_minute=None, seed=None,
+                 path=None, stats_path=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.per_minute = per_minute
+        self.path = path
+        self.stats_path = stats_path  # Where to keep calls and rejected up to date, as JSON
+        self.calls = Counter()  # API calls by method name, 429s included
+        self.rejected = 0  # Calls answered with a 429
+        self._spreadsheets = {
+            name: EmulatedSpreadsheet(self, name, rows) for name, rows in spreadsheets.items()
+        }
+        self._random = random.Random(seed)
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._stamp = self._file_stamp()
+
+    @classmethod
+    def from_file(cls, path, shared=False, **options):
+        # shared: keep using the file as the backend rather than a copy of it
+        with open(path) as f:
+            return cls(json.load(f), path=path if shared else None, **options)
+
+    @classmethod
+    def from_tables(cls, tables, **options):
+        # tables: spreadsheet name -> DataFrame, e.g. from benchmarks/synthetic.py
+        return cls({name: sheet_values(df) for name, df in tables.items()}, **options)
+
+    def save(self, path):
+        with self._reading():
+            self._dump(path)
+
+    def _dump(self, path):
+        spreadsheets = {name: spreadsheet._sheet1.rows for name, spreadsheet in self._spreadsheets.items()}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(spreadsheets, f)
+        os.replace(tmp, path)
+
+    def _file_stamp(self):
+        if self.path is None:
+            return None
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _sync(self):
+        # Pick up writes other processes made to the backing file
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            with open(self.path) as f:
+                spreadsheets = json.load(f)
+            for name, rows in spreadsheets.items():
+                if name in self._spreadsheets:
+                    self._spreadsheets[name]._sheet1.rows = rows
+            self._stamp = stamp
+
+    @contextmanager
+    def _reading(self):
+        with self._lock:
+            if self.path is not None:
+                self._sync()
+            yield
+
+    @contextmanager
+    def _writing(self):
+        with self._lock:
+            if self.path is None:
+                yield
+                return
+            with file_lock(self.path + ".lock"):
+                self._sync()
+                yield
+                self._dump(self.path)
+                self._stamp = self._file_stamp()
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.rejected = 0
+
+    def open(self, name):
+        self._api_call("open", injectable=False)
+        if name not in self._spreadsheets:
+            raise SpreadsheetNotFound(name)
+        return self._spreadsheets[name]
+
+    def _api_call(self, method, injectable=True):
+        # Count the call, wait out its latency, then maybe reject it
+        with self._lock:
+            self.calls[method] += 1
+            now = time.monotonic()
+            while self._recent and self._recent[0] <= now - 60:
+                self._recent.popleft()
+            over_quota = self.per_minute is not None and len(self._recent) >= self.per_minute
+            self._recent.append(now)
+            rejected = over_quota or (injectable and self._random.random() < self.error_rate)
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if rejected:
+                self.rejected += 1
+            if self.stats_path is not None:
+                self._write_stats()
+        if delay > 0:
+            time.sleep(delay)
+        if rejected:
+            raise quota_error()
+
+    def _write_stats(self):
+        tmp = self.stats_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"calls": self.calls, "rejected": self.rejected}, f)
+        os.replace(tmp, self.stats_path)
+
+
+def _client_from_env():
+    per_minute = os.getenv("SHEETS_EMULATOR_PER_MINUTE")
+    stats_dir = os.getenv("SHEETS_EMULATOR_STATS")
+    return EmulatedClient.from_file(
+        os.environ["SHEETS_EMULATOR"],
+        shared=True,
+        stats_path=os.path.join(stats_dir, f"{os.getpid()}.json") if stats_dir else None,
+        latency=float(os.getenv("SHEETS_EMULATOR_LATENCY", "0")),
+        jitter=float(os.getenv("SHEETS_EMULATOR_JITTER", "0")),
+        error_rate=float(os.getenv("SHEETS_EMULATOR_ERROR_RATE", "0")),
+        per_minute=int(per_minute) if per_minute else None,
+    )
+
+
+_env_client = PerProcess(_client_from_env)
+
+
+def emulator_from_env():
+    # The emulator configured by SHEETS_EMULATOR and SHEETS_EMULATOR_* settings,
+    # one per process. The file is shared, but the per-minute quota is counted
+    # per process. With SHEETS_EMULATOR_STATS set to a directory, each process
+    # keeps its call counts in <pid>.json there.
+    return _env_client.get()
+
+
+def quota_error():
+    # The APIError gspread raises for a 429 RESOURCE_EXHAUSTED response
+    response = Response()
+    response.status_code = 429
+    response._content = json.dumps({"error": {
+        "code": 429,
+        "message": "Quota exceeded for quota metric 'Requests per minute per user' (emulated)",
+        "status": "RESOURCE_EXHAUSTED",
+    }}).encode()
+    return APIError(response)
+
+
+def sheet_values(df):
+    # DataFrame as the rows of strings Sheets would hold, header first
+    rows = [[str(column) for column in df.columns]]
+    rows.extend([["" if value is None else str(value) for value in row] for row in df.itertuples(index=False)])
+    return rows
+
+
+class EmulatedSpreadsheet:
+    def __init__(self, client, name, rows):
+        self.client = client
+        self.title = name
+        self._sheet1 = EmulatedWorksheet(client, rows)
+
+    @property
+    def sheet1(self):
+        self.client._api_call("sheet1", injectable=False)  # gspread fetches the spreadsheet metadata here
+        return self._sheet1
+
+
+class EmulatedWorksheet:
+    def __init__(self, client, rows):
+        self.client = client
+        self.rows = [[str(value) for value in row] for row in rows]
+
+    def _padded(self):
+        # Rows padded to the widest one, as Sheets returns a rectangular range
+        width = max((len(row) for row in self.rows), default=0)
+        return [row + [""] * (width - len(row)) for row in self.rows]
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = "" if value is None else str(value)
+
+    def get_all_values(self, *args, **kwargs):
+        self.client._api_call("get_all_values")
+        with self.client._reading():
+            return self._padded()
+
+    def get_all_records(self, head=1, default_blank="", empty2zero=False, **kwargs):
+        self.client._api_call("get_all_records")
+        with self.client._reading():
+            rows = self._padded()
+        if len(rows) < head:
+            return []
+        keys = rows[head - 1]
+        return [dict(zip(keys, numericise_all(row, empty2zero, default_blank))) for row in rows[head:]]
+
+    def row_values(self, row, *args, **kwargs):
+        self.client._api_call("row_values")
+        with self.client._reading():
+            values = list(self.rows[row - 1]) if row <= len(self.rows) else []
+        while values and values[-1] == "":
+            values.pop()  # Sheets leaves out trailing blank cells
+        return values
+
+    def cell(self, row, col, *args, **kwargs):
+        self.client._api_call("cell")
+        with self.client._reading():
+            cells = self.rows[row - 1] if row <= len(self.rows) else []
+            return Cell(row, col, cells[col - 1] if col <= len(cells) else "")
+
+    def update_cell(self, row, col, value):
+        self.client._api_call("update_cell")
+        with self.client._writing():
+            self._set(row, col, value)
+        return {}
+
+    def append_row(self, values, *args, **kwargs):
+        self.client._api_call("append_row")
+        with self.client._writing():
+            while self.rows and not any(self.rows[-1]):
+                self.rows.pop()  # Appends land after the last non-blank row
+            self.rows.append(["" if value is None else str(value) for value in values])
+        return {}
+
+    def update(self, values=None, range_name=None, **kwargs):
+        self.client._api_call("update")
+        if isinstance(values, str):
+            values, range_name = range_name, values  # gspread 5 argument order
+        with self.client._writing():
+            self._write_range(range_name or "A1", values)
+        return {}
+
+    def batch_update(self, data, **kwargs):
+        self.client._api_call("batch_update")
+        with self.client._writing():
+            for update in data:
+                self._write_range(update["range"], update["values"])
+        return {}
+
+    def _write_range(self, range_name, values):
+        grid = a1_range_to_grid_range(range_name)
+        first_row, first_col = grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0)
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                self._set(first_row + i + 1, first_col + j + 1, value)
+
+    def delete_rows(self, start_index, end_index=None):
+        self.client._api_call("delete_rows")
+        with self.client._writing():
+            del self.rows[start_index - 1:end_index or start_index]
+        return {}
+
+    def delete_columns(self, start_index, end_index=None):
+        self.client._api_call("delete_columns")
+        with self.client._writing():
+            for row in self.rows:
+                del row[start_index - 1:end_index or start_index]
+        return {}
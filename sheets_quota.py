@@ -0,0 +1,143 @@
+import random
+import threading
+import time
+from collections import deque
+
+from gspread.exceptions import APIError
+from gspread.utils import rowcol_to_a1
+
+import metrics
+
+
+WRITE = "write"  # User writes, and the reads they depend on
+READ = "read"  # Background and bulk reads, which give way to writes
+
+READ_METHODS = {"get_all_records", "get_all_values", "row_values", "col_values", "cell", "acell", "get"}
+
+
+# A call that would have to wait for budget (or a 429 retry) past its deadline
+class QuotaExhausted(Exception):
+    pass
+
+
+# Sheets API calls made in the last minute, against a per-minute budget.
+# Low-priority reads wait once they'd eat into the share reserved for writes;
+# writes only wait when the whole budget is used, so they are delayed rather
+# than rejected with a 429. A caller with a deadline gets QuotaExhausted
+# instead of a wait that would run past it.
+class QuotaBudget:
+    def __init__(self, per_minute=60, write_reserve=0.2):
+        self.per_minute = per_minute
+        self.write_reserve = write_reserve  # Fraction of the budget reads can't use
+        self.waited = 0.0  # Total seconds callers spent waiting for budget
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def _limit(self, priority):
+        if priority == WRITE:
+            return self.per_minute
+        return max(1, int(self.per_minute * (1 - self.write_reserve)))
+
+    def acquire(self, priority=WRITE, deadline=None):
+        # deadline: time.monotonic() by which the call must have started
+        limit = self._limit(priority)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and self._calls[0] <= now - 60:
+                    self._calls.popleft()
+                if len(self._calls) < limit:
+                    self._calls.append(now)
+                    return
+                wait = self._calls[len(self._calls) - limit] + 60 - now
+                if deadline is not None and now + wait > deadline:
+                    raise QuotaExhausted(f"{priority} budget used up for another {wait:.1f}s")
+                self.waited += wait
+            time.sleep(wait)
+
+    def used(self):
+        with self._lock:
+            cutoff = time.monotonic() - 60
+            return sum(1 for called_at in self._calls if called_at > cutoff)
+
+
+# Runs Sheets calls against the budget and retries 429 (quota exceeded)
+# responses with exponential backoff and full jitter. A 429 means the request
+# was not carried out, so retrying a write can't apply it twice.
+class QuotaClient:
+    def __init__(self, budget=None, max_retries=5, base_delay=1.0, max_delay=32.0):
+        self.budget = budget or QuotaBudget()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0  # 429s retried so far
+
+    def call(self, fn, *args, priority=WRITE, deadline=None, **kwargs):
+        method = getattr(fn, "__name__", "call")
+        attempt = 0
+        while True:
+            self.budget.acquire(priority, deadline)
+            metrics.inc("sideboard_sheets_api_calls_total", method=method)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except APIError as e:
+                if e.code != 429 or attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    raise
+            finally:
+                metrics.observe("sideboard_sheets_api_seconds", time.perf_counter() - start, method=method)
+            self.retries += 1
+            metrics.inc("sideboard_sheets_api_retries_total")
+            time.sleep(delay)
+            attempt += 1
+
+    def worksheet(self, worksheet, priority=WRITE, deadline=None):
+        return QuotaWorksheet(worksheet, self, priority, deadline)
+
+
+# Worksheet stand-in that sends every API method through a QuotaClient. Reads
+# get the given priority and deadline; anything else is a write.
+class QuotaWorksheet:
+    def __init__(self, worksheet, quota, priority=WRITE, deadline=None):
+        self._worksheet = worksheet
+        self._quota = quota
+        self._priority = priority
+        self._deadline = deadline
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if not callable(attr):
+            return attr
+        if name in READ_METHODS:
+            priority, deadline = self._priority, self._deadline
+        else:
+            priority, deadline = WRITE, None
+
+        def call(*args, **kwargs):
+            return self._quota.call(attr, *args, priority=priority, deadline=deadline, **kwargs)
+        return call
+
+
+# Cell writes to one worksheet, queued and sent as a single batch_update
+class WriteBatch:
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.updates = []
+
+    def set(self, row, col, value):
+        self.updates.append({"range": rowcol_to_a1(row, col), "values": [[value]]})
+
+    def flush(self):
+        if self.updates:
+            self.worksheet.batch_update(self.updates)
+        self.updates = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
+from typing import Mapping
+import hashlib
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from score_matrix import ScoreMatrix, frozen
+
+
+# Everything the routes and the optimizer read, built once per Sheets load.
+# Snapshots are never mutated after construction - a reload builds a new one.
+# Per-deck arrays are indexed like deck_names (row order of Matchup_Data_Cloud).
+@dataclass(frozen=True)
+class DataSnapshot:
+    version: int
+    loaded_at: float
+    matchup_data_df: pd.DataFrame
+    effectiveness_scores_df: pd.DataFrame
+    deck_names: tuple
+    deck_index: Mapping
+    adjusted_playrate: np.ndarray
+    adjusted_winrate: np.ndarray
+    max_slots: np.ndarray
+    matchup_data: Mapping
+    score_matrix: ScoreMatrix
+    total_games_played: int
+    content_hash: str  # Changes whenever anything the optimizer reads changes
+    queued_through: int = 0  # Newest match-queue row folded into matchup_data_df
+
+    @property
+    def card_names(self):
+        return self.score_matrix.card_names
+
+    @cached_property
+    def tables_hash(self):
+        # Every cell of both tables, unlike content_hash which only covers what the
+        # optimizer reads. Computed on first use (the JSON API's ETags).
+        digest = hashlib.blake2b(digest_size=16)
+        for df in (self.matchup_data_df, self.effectiveness_scores_df):
+            digest.update("\x1f".join(map(str, df.columns)).encode())
+            digest.update(b"\x1e")
+            digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+
+def adjust_matchups(matchup_data_df):
+    # === Bayesian Adjustments for Play Rate & Win Rate ===
+    # Column-wise version of the per-row formulas; every element goes through the
+    # same operations in the same order, so the results are bit-for-bit identical.
+    times_fought_raw = matchup_data_df["# of times fought"].to_numpy()
+    total_games_played = matchup_data_df["# of times fought"].sum()
+    total_matchups = len(matchup_data_df)
+
+    expected_playrate = matchup_data_df["MTGO PR"].to_numpy()
+    times_fought = np.maximum(1, times_fought_raw)  # Prevent dividing by 0
+    recorded_winrate = matchup_data_df["# of match wins"].to_numpy() / times_fought
+
+    # Bayesian adjustment using an inversely proportional K factor. With no games
+    # recorded yet K is unbounded and the prior is all that's left: the MTGO play rate.
+    if total_games_played == 0:
+        adjusted_playrate = expected_playrate.astype(float)
+    else:
+        adjusted_playrate = ((times_fought) + (expected_playrate * (total_matchups / total_games_played))) / (total_games_played + (total_matchups / total_games_played))
+    adjusted_winrate = ((recorded_winrate) * (times_fought) + (0.5 * (100 / times_fought))) / ((100 / times_fought) + times_fought)
+
+    max_slots = matchup_data_df["Max Slots"].to_numpy()
+    return adjusted_playrate, adjusted_winrate, max_slots, total_games_played
+
+
+def content_hash(score_matrix, adjusted_playrate, adjusted_winrate, max_slots):
+    digest = hashlib.blake2b(digest_size=16)
+    for names in (score_matrix.card_names, score_matrix.deck_names):
+        digest.update("\x1f".join(map(str, names)).encode())
+        digest.update(b"\x1e")
+    for array in (score_matrix.scores, score_matrix.max_copies, score_matrix.totals,
+                  adjusted_playrate, adjusted_winrate, max_slots):
+        digest.update(str(array.dtype).encode())
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+@metrics.timed("build_snapshot")
+def build_snapshot(matchup_data_df, effectiveness_scores_df, version=0, previous=None, queued_through=0):
+    # previous: the snapshot this one replaces, whose cached card rankings are reused
+    # queued_through: id of the newest queued match already added to matchup_data_df
+    adjusted_playrate, adjusted_winrate, max_slots, total_games_played = adjust_matchups(matchup_data_df)
+    deck_names = tuple(matchup_data_df["Deck"].tolist())
+
+    score_matrix = ScoreMatrix.from_dataframe(
+        effectiveness_scores_df, deck_names, previous.score_matrix if previous is not None else None
+    )
+
+    return assemble_snapshot(
+        matchup_data_df, effectiveness_scores_df, score_matrix,
+        adjusted_playrate, adjusted_winrate, max_slots, total_games_played,
+        version=version, loaded_at=time.time(), queued_through=queued_through,
+    )
+
+
+def with_matchups(snapshot, matchup_data_df, version=0, queued_through=0):
+    # snapshot with new Matchup_Data_Cloud counters for the same decks. The
+    # score matrix only depends on the other table, so it is shared as is.
+    adjusted_playrate, adjusted_winrate, max_slots, total_games_played = adjust_matchups(matchup_data_df)
+    return assemble_snapshot(
+        matchup_data_df, snapshot.effectiveness_scores_df, snapshot.score_matrix,
+        adjusted_playrate, adjusted_winrate, max_slots, total_games_played,
+        version=version, loaded_at=snapshot.loaded_at, queued_through=queued_through,
+    )
+
+
+def assemble_snapshot(matchup_data_df, effectiveness_scores_df, score_matrix,
+                      adjusted_playrate, adjusted_winrate, max_slots, total_games_played,
+                      version=0, loaded_at=0.0, queued_through=0):
+    # DataSnapshot from already computed parts, e.g. ones read back from disk
+    deck_names = score_matrix.deck_names
+    matchup_data = {
+        deck_name: MappingProxyType({
+            "adjusted_playrate": playrate,
+            "adjusted_winrate": winrate,
+            "max_slots": slots
+        })
+        for deck_name, playrate, winrate, slots in zip(
+            deck_names, adjusted_playrate.tolist(), adjusted_winrate.tolist(), max_slots.tolist()
+        )
+    }
+
+    return DataSnapshot(
+        version=version,
+        loaded_at=loaded_at,
+        matchup_data_df=matchup_data_df,
+        effectiveness_scores_df=effectiveness_scores_df,
+        deck_names=deck_names,
+        deck_index=MappingProxyType({deck: i for i, deck in enumerate(deck_names)}),
+        adjusted_playrate=frozen(adjusted_playrate),
+        adjusted_winrate=frozen(adjusted_winrate),
+        max_slots=frozen(max_slots),
+        matchup_data=MappingProxyType(matchup_data),
+        score_matrix=score_matrix,
+        total_games_played=total_games_played,
+        content_hash=content_hash(score_matrix, adjusted_playrate, adjusted_winrate, max_slots),
+        queued_through=queued_through,
+    )
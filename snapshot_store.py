@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from concurrency import fcntl, file_lock
+from score_matrix import ScoreMatrix
+from snapshot import assemble_snapshot
+
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 1
+ARRAYS = ("scores", "max_copies", "totals", "adjusted_playrate", "adjusted_winrate", "max_slots")
+
+
+def _save_table(df, directory, name):
+    # Numeric columns go into one .npy per dtype (memory-mapped on load), the
+    # rest (names, blank cells mixed into numbers) into the JSON metadata
+    blocks, objects = {}, {}
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        if column.dtype.kind in "iufb":
+            blocks.setdefault(column.dtype.str, []).append(position)
+        else:
+            objects[position] = column.tolist()
+
+    meta = {"columns": [str(column) for column in df.columns], "rows": len(df), "blocks": [], "objects": objects}
+    for i, (dtype, positions) in enumerate(blocks.items()):
+        filename = f"{name}.{i}.npy"
+        np.save(os.path.join(directory, filename), df.iloc[:, positions].to_numpy(dtype=dtype),
+                allow_pickle=False)
+        meta["blocks"].append({"file": filename, "positions": positions})
+    return meta
+
+
+def _load_table(directory, meta):
+    columns = {}
+    for block in meta["blocks"]:
+        values = np.load(os.path.join(directory, block["file"]), mmap_mode="r")
+        for j, position in enumerate(block["positions"]):
+            columns[position] = values[:, j]
+    for position, values in meta["objects"].items():
+        columns[int(position)] = values
+
+    df = pd.DataFrame({position: columns[position] for position in range(len(meta["columns"]))},
+                      index=pd.RangeIndex(meta["rows"]))
+    df.columns = meta["columns"]
+    return df
+
+
+# The last good snapshot on local disk, shared by every worker process. Each
+# save goes to its own directory, named by content, and is published by
+# atomically replacing the CURRENT pointer, which also carries a serial number
+# that goes up with every new snapshot; a reader never sees a half-written
+# snapshot, and can tell from the serial alone whether there is a new one.
+# Arrays are memory-mapped, so workers reading the same save share one copy
+# of them in the page cache (put the directory on /dev/shm to keep it in RAM).
+class SnapshotStore:
+    def __init__(self, directory="snapshot_cache"):
+        self.directory = directory
+        self.loaded_serial = None  # Serial of the snapshot this process last saved or loaded
+        self._refresher_file = None
+        self._refresher_pid = None
+
+    def published(self):
+        # {"serial", "name", "loaded_at"} of the current save, or None
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @contextmanager
+    def _locked(self):
+        # Serializes publishing between processes, so serials are never reused
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(os.path.join(self.directory, ".lock")):
+            yield
+
+    def elected(self):
+        # Whether this process is the one that refreshes from storage. The first
+        # to ask wins and keeps the role until it exits, when the next one to ask
+        # takes over.
+        if fcntl is None:
+            return True  # Windows: a single process, so it always refreshes
+        if self._refresher_pid != os.getpid():
+            # A lock inherited over fork belongs to the parent, not this worker
+            if self._refresher_file is not None:
+                self._refresher_file.close()
+            self._refresher_file = None
+            self._refresher_pid = os.getpid()
+        if self._refresher_file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            refresher_file = open(os.path.join(self.directory, ".refresher"), "a")
+            try:
+                fcntl.flock(refresher_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                refresher_file.close()
+                return False
+            self._refresher_file = refresher_file
+        return True
+
+    def save(self, snapshot):
+        # Publish snapshot; returns False if the same data was already published,
+        # in which case only its load time moves forward
+        name = f"{snapshot.tables_hash}-{snapshot.content_hash}"
+        with self._locked():
+            current = self.published()
+            if current is not None and current["name"] == name:
+                if snapshot.loaded_at > current["loaded_at"]:
+                    self._point_to(dict(current, loaded_at=snapshot.loaded_at))
+                self.loaded_serial = current["serial"]
+                return False
+
+            staging = tempfile.mkdtemp(prefix=".staging-", dir=self.directory)
+            try:
+                matrix = snapshot.score_matrix
+                arrays = {
+                    "scores": matrix.scores,
+                    "max_copies": matrix.max_copies,
+                    "totals": matrix.totals,
+                    "adjusted_playrate": snapshot.adjusted_playrate,
+                    "adjusted_winrate": snapshot.adjusted_winrate,
+                    "max_slots": snapshot.max_slots,
+                }
+                for array_name, array in arrays.items():
+                    # An object array would be pickled, and load can't memory-map it
+                    np.save(os.path.join(staging, f"{array_name}.npy"), array, allow_pickle=False)
+
+                manifest = {
+                    "format": FORMAT,
+                    "loaded_at": snapshot.loaded_at,
+                    "queued_through": snapshot.queued_through,
+                    "total_games_played": int(snapshot.total_games_played),
+                    "card_names": list(matrix.card_names),
+                    "deck_names": list(matrix.deck_names),
+                    "matchup": _save_table(snapshot.matchup_data_df, staging, "matchup"),
+                    "effectiveness": _save_table(snapshot.effectiveness_scores_df, staging, "effectiveness"),
+                }
+                with open(os.path.join(staging, "manifest.json"), "w") as f:
+                    json.dump(manifest, f)
+
+                target = os.path.join(self.directory, name)
+                if os.path.isdir(target):
+                    shutil.rmtree(staging)  # Published before and still on disk
+                else:
+                    os.rename(staging, target)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+
+            serial = (current["serial"] if current is not None else 0) + 1
+            self._point_to({"serial": serial, "name": name, "loaded_at": snapshot.loaded_at})
+            self.loaded_serial = serial
+            self._prune(keep=name)
+        return True
+
+    def _point_to(self, pointer):
+        fd, tmp = tempfile.mkstemp(prefix=".CURRENT-", dir=self.directory)
+        with os.fdopen(fd, "w") as f:
+            json.dump(pointer, f)
+        os.replace(tmp, os.path.join(self.directory, "CURRENT"))
+
+    def _prune(self, keep):
+        # Older saves; workers that still have them memory-mapped keep their copy
+        for entry in os.listdir(self.directory):
+            path = os.path.join(self.directory, entry)
+            if entry != keep and not entry.startswith(".") and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def load_newer(self, version=0):
+        # The published snapshot if it isn't the one this process already has
+        current = self.published()
+        if current is None or current["serial"] == self.loaded_serial:
+            return None
+        return self.load(version)
+
+    def load(self, version=0):
+        # The published snapshot, or None if there isn't a usable one
+        current = self.published()
+        if current is None:
+            return None
+        path = os.path.join(self.directory, current["name"])
+        try:
+            with open(os.path.join(path, "manifest.json")) as f:
+                manifest = json.load(f)
+            if manifest["format"] != FORMAT:
+                return None
+            arrays = {array_name: np.load(os.path.join(path, f"{array_name}.npy"), mmap_mode="r")
+                      for array_name in ARRAYS}
+            matchup_data_df = _load_table(path, manifest["matchup"])
+            effectiveness_scores_df = _load_table(path, manifest["effectiveness"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable saved snapshot %s: %s", path, e)
+            return None
+
+        self.loaded_serial = current["serial"]
+        score_matrix = ScoreMatrix(
+            manifest["card_names"], manifest["deck_names"],
+            arrays["scores"], arrays["max_copies"], arrays["totals"],
+        )
+        return assemble_snapshot(
+            matchup_data_df, effectiveness_scores_df, score_matrix,
+            arrays["adjusted_playrate"], arrays["adjusted_winrate"], arrays["max_slots"],
+            manifest["total_games_played"],
+            version=version, loaded_at=manifest["loaded_at"], queued_through=manifest["queued_through"],
+        )
@@ -0,0 +1,498 @@
+import functools
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent import futures
+
+import pandas as pd
+from google.auth.exceptions import RefreshError
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from oauth2client.client import AccessTokenRefreshError
+
+import metrics
+from sheets_quota import READ, QuotaBudget, QuotaClient, WriteBatch
+
+
+MATCHUP_COLUMNS = ["Deck", "MTGO PR", "Max Slots", "# of times fought", "# of match wins"]
+MATCHUP_DTYPES = {"MTGO PR": float, "Max Slots": int, "# of times fought": int, "# of match wins": int}
+
+
+class NotFound(LookupError):
+    pass
+
+
+class AlreadyExists(ValueError):
+    pass
+
+
+class SheetsFetchError(RuntimeError):
+    # Raised by a concurrent load when one or both sheets failed; errors maps
+    # sheet name -> exception so the caller sees every failure, not just the first
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("Failed to load " + "; ".join(
+            f"{name}: {type(error).__name__}: {error}" for name, error in errors.items()
+        ))
+
+
+# Everything the routes persist goes through this interface. load_tables()
+# returns the two tables in the shape of the original sheets:
+#   Matchup_Data_Cloud:          Deck, MTGO PR, Max Slots, # of times fought, # of match wins
+#   Effectiveness_Scores_Cloud:  Card Name, Max Copies, <one column per deck>
+# Writes raise NotFound for a missing deck or card, and AlreadyExists where the
+# backend keeps names unique and one is taken.
+class Storage(ABC):
+    @abstractmethod
+    def load_tables(self):
+        pass
+
+    @abstractmethod
+    def add_deck(self, deck_name, mtgo_pr, max_slots, scores):
+        # scores: card name -> effectiveness against the new deck
+        pass
+
+    @abstractmethod
+    def update_deck(self, deck_name, mtgo_pr, max_slots):
+        pass
+
+    @abstractmethod
+    def remove_deck(self, deck_name):
+        pass
+
+    @abstractmethod
+    def add_card(self, card_name, max_copies, scores):
+        # scores: deck name -> effectiveness of the new card
+        pass
+
+    @abstractmethod
+    def update_card(self, card_name, max_copies=None, scores=None):
+        # Only the given fields change; scores may cover a subset of decks
+        pass
+
+    @abstractmethod
+    def remove_card(self, card_name):
+        pass
+
+    @abstractmethod
+    def record_match(self, deck_name, match_win):
+        pass
+
+    @abstractmethod
+    def record_matches(self, deltas, before_write=None):
+        # deltas: deck name -> (matches played, match wins) to add to its counters.
+        # Returns the deck names that no longer exist; their deltas are skipped.
+        # before_write(counters), if given, is called with the counters of the
+        # decks being updated as they were read, right before the write.
+        pass
+
+    @abstractmethod
+    def match_counters(self):
+        # deck name -> (# of times fought, # of match wins), read from storage
+        pass
+
+
+def _needs_reconnect(error):
+    # Revoked or expired credentials, or a spreadsheet renamed or deleted under us
+    if isinstance(error, (SpreadsheetNotFound, WorksheetNotFound, RefreshError, AccessTokenRefreshError)):
+        return True
+    return isinstance(error, APIError) and error.code in (401, 403, 404)
+
+
+def _write(method):
+    # Marks a GoogleSheetsStorage method that changes a sheet. Once it returns,
+    # fetches already in flight are no longer shared with new loads.
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            with self._inflight_lock:
+                self._generation += 1
+    return wrapper
+
+
+class GoogleSheetsStorage(Storage):
+    def __init__(self, sheets, matchup_sheet="Matchup_Data_Cloud", effectiveness_sheet="Effectiveness_Scores_Cloud",
+                 fetch_timeout=20, quota=None):
+        self.sheets = sheets  # SheetsClientManager
+        # Every API call goes through this: per-minute budget, 429 retries
+        self.quota = quota or QuotaClient()
+        self.matchup_sheet = matchup_sheet
+        self.effectiveness_sheet = effectiveness_sheet
+        self.fetch_timeout = fetch_timeout  # Seconds each sheet download may take
+        # Both sheets download side by side, so a reload costs one round trip, not two
+        self._fetch_pool = futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="sheets-fetch")
+        # At most one download per sheet at a time: a load joins a fetch of the same
+        # sheet that is still running (e.g. one a previous load gave up waiting
+        # on), unless a write has finished since that fetch started or it has
+        # already had fetch_timeout seconds
+        self._inflight = {}  # sheet name -> (write generation, time.monotonic() at submit, future)
+        self._inflight_lock = threading.Lock()
+        self._generation = 0
+
+    def _worksheets(self):
+        # First worksheets of Matchup_Data_Cloud and Effectiveness_Scores_Cloud, for writes
+        return (self.quota.worksheet(self.sheets.worksheet(self.matchup_sheet, self.quota)),
+                self.quota.worksheet(self.sheets.worksheet(self.effectiveness_sheet, self.quota)))
+
+    def _fetch(self, name, deadline):
+        # Loads are mostly background refreshes, so they give way to writes. Past
+        # the deadline nobody waits for the result any more, so rather than sleep
+        # for budget the fetch fails and frees its pool thread.
+        sheet = self.quota.worksheet(self.sheets.worksheet(name, self.quota, READ, deadline),
+                                     priority=READ, deadline=deadline)
+        records = sheet.get_all_records()
+        with metrics.span("dataframe_build"):
+            return pd.DataFrame(records)
+
+    def _fetch_future(self, name):
+        with self._inflight_lock:
+            generation, started, future = self._inflight.get(name, (None, None, None))
+            if (future is None or future.done() or generation != self._generation
+                    or time.monotonic() - started >= self.fetch_timeout):
+                started = time.monotonic()
+                future = self._fetch_pool.submit(self._fetch, name, started + self.fetch_timeout)
+                self._inflight[name] = (self._generation, started, future)
+            return future
+
+    @metrics.timed("load_tables")
+    def load_tables(self):
+        names = (self.matchup_sheet, self.effectiveness_sheet)
+        pending = {name: self._fetch_future(name) for name in names}
+        futures.wait(pending.values(), timeout=self.fetch_timeout)
+
+        tables, errors = {}, {}
+        for name, future in pending.items():
+            if not future.done():
+                # The request keeps running in its worker; its result is discarded
+                future.cancel()
+                errors[name] = TimeoutError(f"no response after {self.fetch_timeout}s")
+            elif future.exception() is not None:
+                errors[name] = future.exception()
+            else:
+                tables[name] = future.result()
+
+        if errors:
+            # Re-authorize and re-open the sheets on the next attempt, but only if
+            # that can help; a timeout or a 5xx just gets retried on the same handles
+            if any(_needs_reconnect(error) for error in errors.values()):
+                self.sheets.reset()
+            raise SheetsFetchError(errors)
+        return tables[self.matchup_sheet], tables[self.effectiveness_sheet]
+
+    @_write
+    def add_deck(self, deck_name, mtgo_pr, max_slots, scores):
+        sheet1, sheet2 = self._worksheets()
+
+        # Add new deck to Matchup_Data_Cloud
+        new_deck_row = [deck_name, mtgo_pr, max_slots, 0, 0]
+        sheet1.append_row(new_deck_row, value_input_option="USER_ENTERED")
+
+        # Add the new deck as a column in Effectiveness_Scores_Cloud
+        all_data = sheet2.get_all_values()  # Fetch all values to preserve structure
+        if all_data:
+            for row in all_data[1:]:  # Skip header row
+                row.append(str(scores.get(row[0], "")))
+
+            # Add deck name to the header row
+            all_data[0].append(deck_name)
+
+            # Update the entire sheet in one batch operation
+            sheet2.update(all_data)
+
+    @_write
+    def update_deck(self, deck_name, mtgo_pr, max_slots):
+        sheet, _ = self._worksheets()
+        header, row_index, _ = self._find_row(sheet, deck_name, "Deck")
+
+        # Column indices (1-based index for Google Sheets); both cells in one call
+        with WriteBatch(sheet) as batch:
+            batch.set(row_index, header.index("MTGO PR") + 1, mtgo_pr)
+            batch.set(row_index, header.index("Max Slots") + 1, max_slots)
+
+    @_write
+    def remove_deck(self, deck_name):
+        sheet1, sheet2 = self._worksheets()
+
+        # Deck names in Effectiveness Scores are the columns after the first two
+        all_data = sheet2.get_all_values()
+        deck_names = all_data[0][2:] if all_data else []
+        if deck_name not in deck_names:
+            raise NotFound(f"Deck '{deck_name}' not found in {self.effectiveness_sheet}.")
+
+        _, row_index, _ = self._find_row(sheet1, deck_name, "Deck")
+
+        ### **STEP 1: Remove Deck (Row) from Matchup_Data_Cloud**
+        sheet1.delete_rows(row_index)
+
+        ### **STEP 2: Remove Deck (Column) from Effectiveness_Scores_Cloud**
+        col_index = deck_names.index(deck_name) + 3  # +3 because first two columns are ignored
+        sheet2.delete_columns(col_index)
+
+    @_write
+    def add_card(self, card_name, max_copies, scores):
+        _, sheet = self._worksheets()
+
+        # Scores go in the sheet's deck column order
+        deck_names = sheet.row_values(1)[2:]
+        new_row = [card_name, max_copies] + [scores.get(deck, "") for deck in deck_names]
+        sheet.append_row(new_row, value_input_option="USER_ENTERED")
+
+    @_write
+    def update_card(self, card_name, max_copies=None, scores=None):
+        _, sheet = self._worksheets()
+        header, row_index, _ = self._find_row(sheet, card_name, "Card Name")
+
+        # Max Copies and every score in one call
+        with WriteBatch(sheet) as batch:
+            if max_copies is not None:
+                batch.set(row_index, header.index("Max Copies") + 1, max_copies)
+            for deck, score in (scores or {}).items():
+                if deck in header[2:]:
+                    batch.set(row_index, header.index(deck) + 1, score)
+
+    @_write
+    def remove_card(self, card_name):
+        _, sheet = self._worksheets()
+        _, row_index, _ = self._find_row(sheet, card_name, "Card Name")
+        sheet.delete_rows(row_index)
+
+    def record_match(self, deck_name, match_win):
+        if self.record_matches({deck_name: (1, int(match_win))}):
+            raise NotFound(f"Deck '{deck_name}' not found in {self.matchup_sheet}.")
+
+    @_write
+    def record_matches(self, deltas, before_write=None):
+        sheet, _ = self._worksheets()
+        all_data = sheet.get_all_values()
+        header = all_data[0] if all_data else []
+        rows = {row[0]: row_index for row_index, row in enumerate(all_data[1:], start=2)}
+        counters = self._counters(all_data)
+
+        col_fought = header.index("# of times fought")
+        col_wins = header.index("# of match wins")
+
+        missing = [deck_name for deck_name in deltas if deck_name not in rows]
+        if before_write is not None:
+            before_write({deck_name: counters[deck_name] for deck_name in deltas if deck_name in rows})
+
+        # Every counter in one call
+        with WriteBatch(sheet) as batch:
+            for deck_name, (played, wins) in deltas.items():
+                if deck_name in rows:
+                    fought, won = counters[deck_name]
+                    batch.set(rows[deck_name], col_fought + 1, fought + played)
+                    batch.set(rows[deck_name], col_wins + 1, won + wins)
+        return missing
+
+    def match_counters(self):
+        sheet, _ = self._worksheets()
+        return self._counters(sheet.get_all_values())
+
+    def _counters(self, all_data):
+        header = all_data[0] if all_data else []
+        col_fought = header.index("# of times fought")
+        col_wins = header.index("# of match wins")
+        # A blank counter is a deck that hasn't been played yet
+        return {row[0]: (int(row[col_fought] or 0), int(row[col_wins] or 0)) for row in all_data[1:]}
+
+    def _find_row(self, sheet, name, label):
+        # Read the live sheet so row indices are current
+        all_data = sheet.get_all_values()
+        header = all_data[0] if all_data else []
+        names = [row[0] for row in all_data[1:]]
+        if name not in names:
+            sheet_name = self.matchup_sheet if label == "Deck" else self.effectiveness_sheet
+            raise NotFound(f"{label.split()[0]} '{name}' not found in {sheet_name}.")
+
+        position = names.index(name)
+        return header, position + 2, all_data[position + 1]  # +2 for 1-based indexing and the header row
+
+
+# Local storage with the same tables, for offline use and fast reads/writes.
+# One connection per thread; every write runs in a single transaction.
+class SQLiteStorage(Storage):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS decks (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        mtgo_pr REAL NOT NULL DEFAULT 0,
+        max_slots INTEGER NOT NULL DEFAULT 0,
+        times_fought INTEGER NOT NULL DEFAULT 0,
+        match_wins INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS cards (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        max_copies INTEGER NOT NULL DEFAULT 4
+    );
+    CREATE TABLE IF NOT EXISTS scores (
+        card_id INTEGER NOT NULL REFERENCES cards(id) ON DELETE CASCADE,
+        deck_id INTEGER NOT NULL REFERENCES decks(id) ON DELETE CASCADE,
+        score INTEGER NOT NULL,
+        PRIMARY KEY (card_id, deck_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS scores_by_deck ON scores (deck_id, card_id);
+    """
+
+    def __init__(self, path="sideboard.db"):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @metrics.timed("load_tables")
+    def load_tables(self):
+        conn = self._connect()
+        decks = conn.execute(
+            "SELECT id, name, mtgo_pr, max_slots, times_fought, match_wins FROM decks ORDER BY id"
+        ).fetchall()
+        cards = conn.execute("SELECT id, name, max_copies FROM cards ORDER BY id").fetchall()
+        scores = conn.execute("SELECT card_id, deck_id, score FROM scores").fetchall()
+
+        # Typed explicitly so an empty database still gives numeric columns
+        matchup_data_df = pd.DataFrame([row[1:] for row in decks], columns=MATCHUP_COLUMNS).astype(MATCHUP_DTYPES)
+
+        deck_position = {deck_id: i for i, (deck_id, *_) in enumerate(decks)}
+        card_position = {card_id: i for i, (card_id, *_) in enumerate(cards)}
+        score_table = [[0] * len(decks) for _ in cards]
+        for card_id, deck_id, score in scores:
+            score_table[card_position[card_id]][deck_position[deck_id]] = score
+
+        effectiveness_scores_df = pd.DataFrame(
+            [[name, max_copies] + score_row for (_, name, max_copies), score_row in zip(cards, score_table)],
+            columns=["Card Name", "Max Copies"] + [row[1] for row in decks],
+        ).astype({"Max Copies": int})
+        return matchup_data_df, effectiveness_scores_df
+
+    def add_deck(self, deck_name, mtgo_pr, max_slots, scores):
+        with self._connect() as conn:
+            try:
+                deck_id = conn.execute(
+                    "INSERT INTO decks (name, mtgo_pr, max_slots) VALUES (?, ?, ?)", (deck_name, mtgo_pr, max_slots)
+                ).lastrowid
+            except sqlite3.IntegrityError:
+                raise AlreadyExists(f"Deck '{deck_name}' already exists.") from None
+            conn.executemany(
+                "INSERT INTO scores (card_id, deck_id, score) SELECT id, ?, ? FROM cards WHERE name = ?",
+                [(deck_id, score, card) for card, score in scores.items()],
+            )
+
+    def update_deck(self, deck_name, mtgo_pr, max_slots):
+        with self._connect() as conn:
+            updated = conn.execute(
+                "UPDATE decks SET mtgo_pr = ?, max_slots = ? WHERE name = ?", (mtgo_pr, max_slots, deck_name)
+            ).rowcount
+            if not updated:
+                raise NotFound(f"Deck '{deck_name}' not found.")
+
+    def remove_deck(self, deck_name):
+        with self._connect() as conn:
+            if not conn.execute("DELETE FROM decks WHERE name = ?", (deck_name,)).rowcount:
+                raise NotFound(f"Deck '{deck_name}' not found.")
+
+    def add_card(self, card_name, max_copies, scores):
+        with self._connect() as conn:
+            try:
+                card_id = conn.execute(
+                    "INSERT INTO cards (name, max_copies) VALUES (?, ?)", (card_name, max_copies)
+                ).lastrowid
+            except sqlite3.IntegrityError:
+                raise AlreadyExists(f"Card '{card_name}' already exists.") from None
+            conn.executemany(
+                "INSERT INTO scores (card_id, deck_id, score) SELECT ?, id, ? FROM decks WHERE name = ?",
+                [(card_id, score, deck) for deck, score in scores.items()],
+            )
+
+    def update_card(self, card_name, max_copies=None, scores=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT id FROM cards WHERE name = ?", (card_name,)).fetchone()
+            if row is None:
+                raise NotFound(f"Card '{card_name}' not found.")
+            if max_copies is not None:
+                conn.execute("UPDATE cards SET max_copies = ? WHERE id = ?", (max_copies, row[0]))
+            conn.executemany(
+                "INSERT INTO scores (card_id, deck_id, score) SELECT ?, id, ? FROM decks WHERE name = ? "
+                "ON CONFLICT (card_id, deck_id) DO UPDATE SET score = excluded.score",
+                [(row[0], score, deck) for deck, score in (scores or {}).items()],
+            )
+
+    def remove_card(self, card_name):
+        with self._connect() as conn:
+            if not conn.execute("DELETE FROM cards WHERE name = ?", (card_name,)).rowcount:
+                raise NotFound(f"Card '{card_name}' not found.")
+
+    def record_match(self, deck_name, match_win):
+        if self.record_matches({deck_name: (1, int(match_win))}):
+            raise NotFound(f"Deck '{deck_name}' not found.")
+
+    def record_matches(self, deltas, before_write=None):
+        missing = []
+        with self._connect() as conn:
+            if before_write is not None:
+                counters = {name: (fought, wins) for name, fought, wins in conn.execute(
+                    "SELECT name, times_fought, match_wins FROM decks")}
+                before_write({deck_name: counters[deck_name] for deck_name in deltas if deck_name in counters})
+            for deck_name, (played, wins) in deltas.items():
+                updated = conn.execute(
+                    "UPDATE decks SET times_fought = times_fought + ?, match_wins = match_wins + ? WHERE name = ?",
+                    (int(played), int(wins), deck_name),
+                ).rowcount
+                if not updated:
+                    missing.append(deck_name)
+        return missing
+
+    def match_counters(self):
+        rows = self._connect().execute("SELECT name, times_fought, match_wins FROM decks").fetchall()
+        return {name: (fought, wins) for name, fought, wins in rows}
+
+    def import_tables(self, matchup_data_df, effectiveness_scores_df):
+        # Replace everything with the given tables, e.g. a copy of the Google Sheets
+        deck_names = list(effectiveness_scores_df.columns[2:])
+        with self._connect() as conn:
+            conn.execute("DELETE FROM scores")
+            conn.execute("DELETE FROM cards")
+            conn.execute("DELETE FROM decks")
+            conn.executemany(
+                "INSERT INTO decks (name, mtgo_pr, max_slots, times_fought, match_wins) VALUES (?, ?, ?, ?, ?)",
+                matchup_data_df[MATCHUP_COLUMNS].itertuples(index=False, name=None),
+            )
+            conn.executemany(
+                "INSERT INTO cards (name, max_copies) VALUES (?, ?)",
+                effectiveness_scores_df.iloc[:, :2].itertuples(index=False, name=None),
+            )
+            scores = effectiveness_scores_df.melt(id_vars=effectiveness_scores_df.columns[0], value_vars=deck_names)
+            conn.executemany(
+                "INSERT INTO scores (card_id, deck_id, score) "
+                "SELECT cards.id, decks.id, ? FROM cards, decks WHERE cards.name = ? AND decks.name = ?",
+                [(score, card, deck) for card, deck, score in scores.itertuples(index=False, name=None)
+                 if score != "" and not pd.isna(score)],
+            )
+
+
+def make_storage(sheets):
+    # STORAGE_BACKEND=sqlite runs the app fully offline against SQLITE_PATH
+    backend = os.getenv("STORAGE_BACKEND", "sheets")
+    if backend == "sheets":
+        # SHEETS_CALLS_PER_MINUTE is per worker process; keep the total under the project's quota
+        budget = QuotaBudget(per_minute=int(os.getenv("SHEETS_CALLS_PER_MINUTE", "60")))
+        return GoogleSheetsStorage(
+            sheets,
+            fetch_timeout=float(os.getenv("SHEETS_FETCH_TIMEOUT", "20")),
+            quota=QuotaClient(budget),
+        )
+    if backend == "sqlite":
+        return SQLiteStorage(os.getenv("SQLITE_PATH", "sideboard.db"))
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'. Use 'sheets' or 'sqlite'.")
@@ -0,0 +1,93 @@
+import math
+from dataclasses import dataclass
+
+import pandas as pd
+
+
+PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+
+# One page of a sheet-shaped table, after filtering and sorting. The first
+# column is the row name; the first fixed_columns columns are always shown,
+# the rest can be narrowed down with ?columns=.
+@dataclass(frozen=True)
+class TablePage:
+    header: list
+    rows: list
+    total: int  # Rows matching the filter, across all pages
+    page: int
+    pages: int
+    per_page: int
+    sort: str
+    descending: bool
+    query: str
+    selectable_columns: list
+    selected_columns: list
+
+    def link_args(self, **changes):
+        # Query string args for a link to this table with some settings changed
+        args = {
+            "q": self.query,
+            "sort": self.sort,
+            "order": "desc" if self.descending else "asc",
+            "per_page": self.per_page,
+            "columns": self.selected_columns,
+            "page": self.page,
+        }
+        args.update(changes)
+        if not args["sort"]:
+            del args["order"]
+        return {key: value for key, value in args.items() if value not in ("", None, [])}
+
+
+def _sort_key(column):
+    # Numbers sort numerically; blanks and text in a numeric column sort last
+    numeric = pd.to_numeric(column, errors="coerce")
+    if numeric.notna().any():
+        return numeric
+    return column.astype(str).str.lower()
+
+
+def table_page(df, args, fixed_columns=1):
+    # args: request.args - q, sort, order (asc|desc), page, per_page, columns (repeatable)
+    header = list(df.columns)
+    name_column = header[0]
+    rows = df
+
+    query = args.get("q", "").strip()
+    if query:
+        rows = rows[rows[name_column].astype(str).str.contains(query, case=False, regex=False)]
+
+    sort = args.get("sort", "")
+    descending = args.get("order") == "desc"
+    if sort in header:
+        rows = rows.sort_values(sort, ascending=not descending, kind="stable", key=_sort_key, na_position="last")
+    else:
+        sort = ""
+
+    selectable_columns = header[fixed_columns:]
+    selected_columns = [column for column in args.getlist("columns") if column in selectable_columns]
+    shown = header[:fixed_columns] + (selected_columns or selectable_columns)
+
+    per_page = min(max(args.get("per_page", PER_PAGE, type=int), 1), MAX_PER_PAGE)
+    total = len(rows)
+    pages = max(1, math.ceil(total / per_page))
+    page = min(max(args.get("page", 1, type=int), 1), pages)
+
+    start = (page - 1) * per_page
+    rows = rows.iloc[start:start + per_page][shown]
+
+    return TablePage(
+        header=shown,
+        rows=rows.values.tolist(),
+        total=total,
+        page=page,
+        pages=pages,
+        per_page=per_page,
+        sort=sort,
+        descending=descending,
+        query=query,
+        selectable_columns=selectable_columns,
+        selected_columns=selected_columns,
+    )
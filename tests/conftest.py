@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app is a set of top-level modules, like benchmarks/ imports them
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))  # synthetic.make_tables
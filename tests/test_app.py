@@ -0,0 +1,177 @@
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from storage import SQLiteStorage
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    # Imports App.py as a separate module per call, like one gunicorn worker
+    # each, all on the same SQLite database, match queue and snapshot directory
+    storage = SQLiteStorage(str(tmp_path / "sideboard.db"))
+    storage.add_deck("Burn", 0.1, 4, {})
+    storage.add_deck("Tron", 0.05, 3, {})
+    storage.add_card("Pyroblast", 4, {"Burn": 8, "Tron": 2})
+    storage.add_card("Stone Rain", 2, {"Burn": 1, "Tron": 9})
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", storage.path)
+    monkeypatch.setenv("MATCH_QUEUE_PATH", str(tmp_path / "match_queue.db"))
+    monkeypatch.setenv("MATCH_FLUSH_INTERVAL", "3600")  # Matches stay queued unless a test flushes
+    monkeypatch.setenv("SNAPSHOT_DIR", str(tmp_path / "snapshot_cache"))
+    monkeypatch.setenv("SNAPSHOT_POLL_INTERVAL", "0.05")
+    names = []
+
+    def make(**env):
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        name = f"app_worker_{len(names)}"
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, "App.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module  # Flask finds templates/ through it
+        spec.loader.exec_module(module)
+        names.append(name)
+        return module
+
+    yield make
+    for name in names:
+        del sys.modules[name]
+
+
+def deck_counters(client, deck_name):
+    body = client.get("/api/decks").get_json()
+    deck_row = next(row for row in body["data"] if row[0] == deck_name)
+    return deck_row[body["columns"].index("# of times fought")], deck_row[body["columns"].index("# of match wins")]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_matches_queued_by_one_worker_show_up_in_the_others(make_app):
+    worker_a, worker_b = make_app(), make_app()
+    client_a, client_b = worker_a.app.test_client(), worker_b.app.test_client()
+    assert deck_counters(client_a, "Burn") == (0, 0)
+    assert deck_counters(client_b, "Burn") == (0, 0)
+
+    assert client_a.post("/add_match", data={"deck_name": "Burn", "match_result": "2-1"}).status_code == 302
+    assert deck_counters(client_a, "Burn") == (1, 1)
+    # Still only queued, not in storage; B picks it up on its next poll
+    assert wait_for(lambda: deck_counters(client_b, "Burn") == (1, 1))
+
+    worker_b.match_queue.flush()
+    client_b.post("/add_match", data={"deck_name": "Burn", "match_result": "0-2"})
+    assert wait_for(lambda: deck_counters(client_a, "Burn") == (2, 1))
+    assert deck_counters(client_b, "Burn") == (2, 1)
+
+
+def test_api_tables_revalidate_with_their_etag(make_app):
+    client = make_app().app.test_client()
+    response = client.get("/api/decks")
+    etag, _ = response.get_etag()
+    assert response.status_code == 200 and etag.startswith("decks-")
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert [row[0] for row in response.get_json()["data"]] == ["Burn", "Tron"]
+
+    not_modified = client.get("/api/decks", headers={"If-None-Match": response.headers["ETag"]})
+    assert not_modified.status_code == 304 and not_modified.data == b""
+    assert not_modified.headers["ETag"] == response.headers["ETag"]
+
+    client.post("/view_decks", data={"deck_name": "Tron", "new_mtgo_pr": "0.2", "new_max_slots": "5"})
+    changed = client.get("/api/decks", headers={"If-None-Match": response.headers["ETag"]})
+    assert changed.status_code == 200 and changed.get_etag()[0] != etag
+    assert changed.get_json()["data"][1][1:3] == [0.2, 5]
+
+
+def test_greedy_sideboard_etag_skips_the_optimizer(make_app):
+    worker = make_app()
+    client = worker.app.test_client()
+    response = client.get("/api/sideboard")
+    etag, weak = response.get_etag()
+    assert response.status_code == 200 and not weak and etag.startswith("sideboard-greedy-")
+    assert response.get_json()["mode"] == "greedy"
+
+    def no_optimizer(*args):
+        raise AssertionError("a revalidation ran the optimizer")
+    worker.submit_optimizer_job = no_optimizer
+    assert client.get("/api/sideboard", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+def test_exact_sideboard_etag_is_weak(make_app):
+    client = make_app().app.test_client()
+    response = client.get("/api/sideboard?mode=exact")
+    etag, weak = response.get_etag()
+    assert response.status_code == 200 and weak and etag.startswith("sideboard-exact-")
+    assert response.headers["ETag"] == f'W/"{etag}"'
+    assert response.get_json()["solver"]["optimal"]
+
+    # Weak comparison: either form of the tag revalidates
+    for tag in (response.headers["ETag"], f'"{etag}"'):
+        not_modified = client.get("/api/sideboard?mode=exact", headers={"If-None-Match": tag})
+        assert not_modified.status_code == 304 and not_modified.headers["ETag"] == response.headers["ETag"]
+    assert client.get("/api/sideboard?mode=magic").status_code == 400
+
+
+def test_identical_requests_share_one_optimizer_job(make_app):
+    worker = make_app()
+    client = worker.app.test_client()
+    content_hash = worker.data_cache.get().content_hash
+    first = client.post("/api/sideboard/jobs", data={"mode": "exact"})
+    second = client.post("/api/sideboard/jobs", data={"mode": "exact"})
+    assert first.status_code == second.status_code == 202
+    assert first.get_json()["id"] == second.get_json()["id"] == f"exact-{content_hash}"
+    assert first.headers["Location"] == f"/api/sideboard/jobs/exact-{content_hash}"
+
+    done = client.get(first.headers["Location"] + "?wait=5").get_json()
+    assert done["status"] == "done" and done["mode"] == "exact" and done["solver"]["optimal"]
+    # Another worker that never saw the job reruns it for the data it serves
+    other = make_app().app.test_client()
+    assert other.get(first.headers["Location"] + "?wait=5").get_json()["sideboard"] == done["sideboard"]
+    assert other.get("/api/sideboard/jobs/exact-0123?wait=5").status_code == 404
+
+
+def test_a_slow_sideboard_page_answers_with_a_pending_page(make_app):
+    worker = make_app(OPTIMIZER_REQUEST_WAIT="0.05")
+    client = worker.app.test_client()
+    gate, calls = threading.Event(), []
+    optimize_sideboard = worker.optimize_sideboard
+
+    def slow_optimizer(*args):
+        calls.append(None)
+        gate.wait(5)
+        return optimize_sideboard(*args)
+    worker.optimize_sideboard = slow_optimizer
+
+    for _ in range(2):
+        pending = client.get("/sideboard")
+        assert pending.status_code == 200 and b"Still optimizing" in pending.data
+        assert b'http-equiv="refresh"' in pending.data
+    gate.set()
+    assert wait_for(lambda: b"Still optimizing" not in client.get("/sideboard").data)
+    assert b"<td>Pyroblast</td>" in client.get("/sideboard").data and len(calls) == 1
+
+
+def test_result_cache_lookups_are_exported_as_metrics(make_app):
+    client = make_app().app.test_client()
+
+    def lookups(outcome):
+        line = f'sideboard_result_cache_lookups_total{{cache="api_bodies",outcome="{outcome}"}} '
+        rows = [row for row in client.get("/metrics").get_data(as_text=True).splitlines() if row.startswith(line)]
+        return int(rows[0][len(line):]) if rows else 0
+
+    hits, misses = lookups("hit"), lookups("miss")
+    client.get("/api/cards")
+    client.get("/api/cards")
+    assert (lookups("hit"), lookups("miss")) == (hits + 1, misses + 1)
@@ -0,0 +1,172 @@
+import threading
+import time
+
+from data_cache import SnapshotCache
+
+
+class Snapshot:
+    def __init__(self, version):
+        self.version = version
+        self.loaded_at = time.time()
+
+
+# Loader that holds every load until release() so readers pile up behind it
+class GatedLoader:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self._gate = threading.Event()
+
+    def __call__(self, version):
+        self.calls += 1
+        self.started.set()
+        self._gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return Snapshot(version)
+
+    def release(self):
+        self._gate.set()
+
+    def hold(self):
+        # Hold the loads that start from now on
+        self.started.clear()
+        self._gate.clear()
+
+
+def read_concurrently(cache, readers):
+    results, errors = [], []
+
+    def read():
+        try:
+            results.append(cache.get())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_cold_reads_share_one_load():
+    loader = GatedLoader()
+    cache = SnapshotCache(loader, ttl=60)
+    threads, results, errors = read_concurrently(cache, 20)
+    loader.started.wait(5)
+    time.sleep(0.05)  # Let the other readers reach the flight
+    loader.release()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert loader.calls == 1 and cache.loads == 1
+    assert len(results) == 20 and all(snapshot is results[0] for snapshot in results)
+
+
+def test_a_failed_load_is_shared_too():
+    loader = GatedLoader(error=RuntimeError("sheets down"))
+    cache = SnapshotCache(loader, ttl=60)
+    threads, results, errors = read_concurrently(cache, 10)
+    loader.started.wait(5)
+    time.sleep(0.05)
+    loader.release()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == 1
+    assert results == [] and len(errors) == 10 and all(error is loader.error for error in errors)
+
+
+def test_reads_after_a_write_dont_join_the_older_load():
+    loader = GatedLoader()
+    cache = SnapshotCache(loader, ttl=60)
+    first = threading.Thread(target=cache.get)
+    first.start()
+    loader.started.wait(5)
+
+    # The running load may predate the write, so the next read starts its own
+    cache.invalidate()
+    threads, results, errors = read_concurrently(cache, 5)
+    time.sleep(0.05)
+    loader.release()
+    first.join()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert loader.calls == 2 and cache.loads == 2
+    assert all(snapshot is results[0] for snapshot in results)
+    assert cache.peek() is results[0] and not cache.is_invalidated()
+
+
+def test_fresh_snapshot_is_served_without_loading():
+    loader = GatedLoader()
+    loader.release()
+    cache = SnapshotCache(loader, ttl=60)
+    snapshot = cache.get()
+    assert cache.get() is snapshot and cache.get() is snapshot
+    assert loader.calls == 1
+
+
+def test_refresher_keeps_serving_the_last_good_snapshot():
+    calls = []
+
+    def loader(version):
+        calls.append(version)
+        if len(calls) > 1:
+            raise RuntimeError("sheets down")
+        return Snapshot(version)
+
+    cache = SnapshotCache(loader, ttl=0, refresh_interval=0.01)
+    snapshot = cache.get()
+    deadline = time.monotonic() + 5
+    while len(calls) < 2 and time.monotonic() < deadline:
+        assert cache.get() is snapshot  # Stale, but served while the refresher retries
+        time.sleep(0.01)
+    assert len(calls) >= 2
+    assert cache.get() is snapshot
+    assert isinstance(cache.last_error, RuntimeError)
+
+
+def test_only_the_writer_waits_for_the_reload_after_a_write():
+    loader = GatedLoader()
+    loader.release()
+    cache = SnapshotCache(loader, ttl=60)
+    before = cache.get()
+
+    loader.hold()
+    writer = threading.Thread(target=cache.invalidate)
+    writer.start()
+    loader.started.wait(5)
+    threads, results, errors = read_concurrently(cache, 5)
+    for thread in threads:
+        thread.join(1)
+    assert errors == [] and len(results) == 5
+    assert all(snapshot is before for snapshot in results)  # Served without waiting
+    assert writer.is_alive()
+
+    loader.release()
+    writer.join()
+    assert loader.calls == 2
+    assert cache.get() is not before and not cache.is_invalidated()
+
+
+def test_a_failed_reload_after_a_write_is_retried_by_the_next_read():
+    calls = []
+
+    def loader(version):
+        calls.append(version)
+        if len(calls) == 2:
+            raise RuntimeError("sheets down")
+        return Snapshot(version)
+
+    cache = SnapshotCache(loader, ttl=60)
+    before = cache.get()
+    cache.invalidate()
+    assert len(calls) == 2 and isinstance(cache.last_error, RuntimeError)
+    assert cache.peek() is before
+
+    after = cache.get()
+    assert len(calls) == 3 and after is not before and not cache.is_invalidated()
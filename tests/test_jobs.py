@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from jobs import JobQueue, JobQueueFull
+
+
+def test_submits_with_the_same_id_share_one_job():
+    queue = JobQueue(max_workers=2)
+    gate, calls = threading.Event(), []
+
+    def compute():
+        calls.append(None)
+        gate.wait(5)
+        return len(calls)
+
+    jobs = [queue.submit("greedy-abc", compute) for _ in range(5)]
+    other = queue.submit("exact-abc", compute)
+    gate.set()
+    assert all(job is jobs[0] for job in jobs) and other is not jobs[0]
+    assert jobs[0].wait(5) and other.wait(5)
+    assert len(calls) == 2
+    assert queue.get("greedy-abc") is jobs[0] and jobs[0].status == "done"
+    assert queue.submit("greedy-abc", compute) is jobs[0]  # Done jobs are shared too
+    assert len(calls) == 2
+
+
+def test_a_failed_job_runs_again_on_the_next_submit():
+    queue = JobQueue()
+    outcomes = [RuntimeError("solver crashed"), "sideboard"]
+
+    def compute():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    failed = queue.submit("greedy-abc", compute)
+    assert failed.wait(5) and failed.status == "failed" and str(failed.error) == "solver crashed"
+    retried = queue.submit("greedy-abc", compute)
+    assert retried is not failed
+    assert retried.wait(5) and retried.result == "sideboard"
+
+
+def test_the_queue_rejects_work_past_max_pending():
+    queue = JobQueue(max_workers=1, max_pending=2)
+    gate = threading.Event()
+    running = [queue.submit(f"greedy-{i}", lambda: gate.wait(5)) for i in range(2)]
+    with pytest.raises(JobQueueFull):
+        queue.submit("greedy-2", lambda: None)
+    assert queue.submit("greedy-0", lambda: None) is running[0]  # Joining isn't new work
+    gate.set()
+    assert all(job.wait(5) for job in running)
+    assert queue.submit("greedy-2", lambda: "ok").wait(5)
@@ -0,0 +1,124 @@
+import multiprocessing
+
+import pytest
+
+from match_queue import MatchQueue
+from storage import SQLiteStorage
+
+
+def make_storage(path):
+    storage = SQLiteStorage(path)
+    with storage._connect() as conn:
+        conn.execute("INSERT INTO decks (name, times_fought, match_wins) VALUES ('Burn', 10, 5), ('Tron', 3, 1)")
+    return storage
+
+
+# Storage whose next record_matches fails, either before the write reaches the
+# database or after it was applied (a lost response)
+class FlakyStorage:
+    def __init__(self, storage):
+        self.storage = storage
+        self.fail = None  # None, "before" or "after"
+
+    def record_matches(self, deltas, before_write=None):
+        fail, self.fail = self.fail, None
+        if fail == "before":
+            before_write({name: self.storage.match_counters()[name] for name in deltas})
+            raise TimeoutError("no response")
+        missing = self.storage.record_matches(deltas, before_write)
+        if fail == "after":
+            raise TimeoutError("no response")
+        return missing
+
+    def match_counters(self):
+        return self.storage.match_counters()
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return make_storage(str(tmp_path / "sideboard.db"))
+
+
+def queue_for(storage, tmp_path):
+    return MatchQueue(storage, path=str(tmp_path / "queue.db"), flush_interval=3600, max_batch=1000)
+
+
+def test_flush_writes_one_delta_per_deck(storage, tmp_path):
+    queue = queue_for(storage, tmp_path)
+    queue.record("Burn", True)
+    queue.record("Burn", False)
+    queue.record("Tron", True)
+    assert queue.pending_deltas() == ({"Burn": (2, 1), "Tron": (1, 1)}, 3)
+
+    assert queue.flush() == 3
+    assert storage.match_counters() == {"Burn": (12, 6), "Tron": (4, 2)}
+    assert queue.pending_deltas() == ({}, 0)
+
+
+@pytest.mark.parametrize("fail", ["before", "after"])
+def test_a_failed_flush_is_counted_once(storage, tmp_path, fail):
+    flaky = FlakyStorage(storage)
+    queue = queue_for(flaky, tmp_path)
+    queue.record("Burn", True)
+    queue.record("Tron", False)
+    flaky.fail = fail
+    with pytest.raises(TimeoutError):
+        queue.flush()
+
+    queue.record("Burn", True)
+    queue.flush()
+    assert storage.match_counters() == {"Burn": (12, 7), "Tron": (4, 1)}
+    assert queue.pending_deltas() == ({}, 0)
+
+
+def test_reload_settles_a_flush_that_landed(storage, tmp_path):
+    flaky = FlakyStorage(storage)
+    queue = queue_for(flaky, tmp_path)
+    queue.record("Burn", True)
+    flaky.fail = "after"
+    with pytest.raises(TimeoutError):
+        queue.flush()
+
+    # What a reload does: read storage, settle, then fold in what is still queued
+    with queue.locked():
+        queue.settle(storage.match_counters())
+        deltas, _ = queue.pending_deltas()
+    assert deltas == {}
+    assert storage.match_counters()["Burn"] == (11, 6)
+
+
+def record_and_flush(db_path, queue_path, matches):
+    # One gunicorn worker: its own storage and queue objects on the shared files
+    queue = MatchQueue(SQLiteStorage(db_path), path=queue_path, flush_interval=0.001, max_batch=1)
+    for i in range(matches):
+        queue.record("Burn", i % 2)
+        if i % 5 == 0:
+            queue.flush()
+    queue.flush()
+
+
+def test_workers_sharing_the_queue_count_every_match_once(tmp_path):
+    db_path, queue_path = str(tmp_path / "sideboard.db"), str(tmp_path / "queue.db")
+    make_storage(db_path)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=record_and_flush, args=(db_path, queue_path, 40)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+
+    # Meanwhile reload the way fetch_data does; storage plus what is still
+    # queued must never count a match twice
+    storage = SQLiteStorage(db_path)
+    queue = MatchQueue(storage, path=queue_path, flush_interval=3600)
+    seen = []
+    while any(worker.is_alive() for worker in workers):
+        with queue.locked():
+            fought, _ = storage.match_counters()["Burn"]
+            deltas, _ = queue.pending_deltas()
+        seen.append(fought + deltas.get("Burn", (0, 0))[0])
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    assert storage.match_counters()["Burn"] == (10 + 160, 5 + 80)
+    assert all(count <= 10 + 160 for count in seen)
+    assert seen == sorted(seen)
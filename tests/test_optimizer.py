@@ -0,0 +1,169 @@
+import itertools
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import optimizer
+from snapshot import build_snapshot
+from synthetic import make_tables
+
+
+# The optimizer as App.py had it before the snapshot and score matrix: plain
+# dicts rebuilt from the tables. The vectorized version must give the same
+# sideboards, cards in the same order.
+def baseline_greedy(matchup_data_df, effectiveness_scores_df, sideboard_size=15):
+    effectiveness_scores = {}
+    max_card_copies = {}
+    for _, row in effectiveness_scores_df.iterrows():
+        effectiveness_scores[row.iloc[0]] = row.iloc[1:].to_dict()
+        max_card_copies[row.iloc[0]] = int(row["Max Copies"])
+
+    matchup_data = {}
+    total_games_played = matchup_data_df["# of times fought"].sum()
+    total_matchups = len(matchup_data_df)
+    for _, row in matchup_data_df.iterrows():
+        expected_playrate = row["MTGO PR"]
+        times_fought = max(1, row["# of times fought"])
+        recorded_winrate = row["# of match wins"] / times_fought
+        matchup_data[row["Deck"]] = {
+            "adjusted_playrate": ((times_fought) + (expected_playrate * (total_matchups / total_games_played))) / (total_games_played + (total_matchups / total_games_played)),
+            "adjusted_winrate": ((recorded_winrate) * (times_fought) + (0.5 * (100 / times_fought))) / ((100 / times_fought) + times_fought),
+            "max_slots": row["Max Slots"],
+        }
+
+    sideboard_map = {}
+    remaining_slots = sideboard_size
+    sorted_decks = sorted(
+        matchup_data.items(),
+        key=lambda x: (x[1]["adjusted_playrate"] * (2/3)) + ((0.50 - x[1]["adjusted_winrate"]) * (1/3)),
+        reverse=True
+    )
+    for deck_name, data in sorted_decks:
+        if remaining_slots <= 0:
+            break
+        sorted_cards = sorted(effectiveness_scores.keys(), key=lambda card: effectiveness_scores[card].get(deck_name, 0), reverse=True)
+        for card in sorted_cards:
+            if remaining_slots <= 0:
+                break
+            num_copies = min(min(4, remaining_slots, max_card_copies.get(card, 4)), data["max_slots"])
+            if num_copies > 0:
+                sideboard_map[card] = num_copies
+                remaining_slots -= num_copies
+
+    penalty_tracker = {}
+    seen_sideboards = set()
+    for iteration in range(100):
+        sideboard_tuple = tuple(sorted(sideboard_map.items()))
+        if sideboard_tuple in seen_sideboards:
+            break
+        seen_sideboards.add(sideboard_tuple)
+
+        removable_cards = {}
+        dead_cards = []
+        for deck, data in matchup_data.items():
+            boardable = sum(sideboard_map.get(card, 0) for card in sideboard_map if effectiveness_scores[card].get(deck, 0) > 5)
+            if boardable > data["max_slots"]:
+                excess = boardable - data["max_slots"]
+                removable_cards[deck] = sorted(
+                    (card for card in sideboard_map if effectiveness_scores[card].get(deck, 0) > 5),
+                    key=lambda c: effectiveness_scores[c][deck]
+                )[:max(1, excess // 3)]
+        for card in list(sideboard_map.keys()):
+            if sum(1 for deck in matchup_data if effectiveness_scores[card].get(deck, 0) > 5) <= 2:
+                dead_cards.append(card)
+        for deck, cards in removable_cards.items():
+            for card in cards:
+                if card in sideboard_map and sideboard_map[card] > 0:
+                    sideboard_map[card] -= 1
+                    if sideboard_map[card] == 0:
+                        del sideboard_map[card]
+                    penalty_tracker[card] = penalty_tracker.get(card, 0) + 1
+        for card in dead_cards:
+            if card in sideboard_map:
+                del sideboard_map[card]
+
+        remaining_slots = sideboard_size - sum(sideboard_map.values())
+        if remaining_slots > 0:
+            additional_cards = sorted(
+                effectiveness_scores.keys(),
+                key=lambda c: (sum(effectiveness_scores[c].values()) - penalty_tracker.get(c, 0)) + sum(1 for deck in matchup_data if effectiveness_scores[c].get(deck, 0) > 5) * 3,
+                reverse=True
+            )
+            for card in additional_cards:
+                if remaining_slots <= 0:
+                    break
+                if card not in sideboard_map or sideboard_map[card] < max_card_copies[card]:
+                    sideboard_map[card] = sideboard_map.get(card, 0) + 1
+                    remaining_slots -= 1
+    return sideboard_map
+
+
+@pytest.mark.parametrize("n_cards, n_decks, seed", [
+    (8, 3, 0), (20, 5, 1), (40, 12, 2), (40, 12, 3), (60, 20, 4), (100, 8, 5), (15, 30, 6),
+])
+def test_greedy_matches_baseline(n_cards, n_decks, seed):
+    matchup_data_df, effectiveness_scores_df = make_tables(n_cards, n_decks, seed)
+    expected = baseline_greedy(matchup_data_df, effectiveness_scores_df)
+
+    sideboard_map, result = optimizer.optimize_sideboard(build_snapshot(matchup_data_df, effectiveness_scores_df))
+    assert result is None
+    assert list(sideboard_map.items()) == list(expected.items())
+
+
+def random_tables(rnd):
+    decks = [f"D{i}" for i in range(rnd.randint(1, 4))]
+    matchup_rows = []
+    for deck in decks:
+        times_fought = rnd.randint(0, 20)
+        matchup_rows.append({"Deck": deck, "MTGO PR": rnd.uniform(0, 0.2), "Max Slots": rnd.randint(0, 6),
+                             "# of times fought": times_fought, "# of match wins": rnd.randint(0, times_fought)})
+    effectiveness_rows = [{"Card Name": f"C{i}", "Max Copies": rnd.randint(0, 4), **{deck: rnd.randint(0, 10) for deck in decks}}
+                          for i in range(rnd.randint(3, 6))]
+    return pd.DataFrame(matchup_rows), pd.DataFrame(effectiveness_rows)
+
+
+def brute_force(data, sideboard_size):
+    # Best objective over every copies-per-card vector within the limits
+    matrix = data.score_matrix
+    values = optimizer.card_values(data)
+    limits = [min(4, int(copies)) for copies in matrix.max_copies]
+    best = 0.0
+    for combo in itertools.product(*[range(limit + 1) for limit in limits]):
+        counts = np.array(combo)
+        if counts.sum() <= sideboard_size and np.all(counts @ matrix.effective <= data.max_slots):
+            best = max(best, float(counts @ values))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_exact_solver_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    data = build_snapshot(*random_tables(rnd))
+    sideboard_size = rnd.randint(1, 15)
+
+    result = optimizer.solve_exact(data, sideboard_size, time_limit=5)
+    assert result.optimal
+    assert result.objective == pytest.approx(brute_force(data, sideboard_size), abs=1e-9)
+    assert result.upper_bound == result.objective
+    assert sum(result.sideboard_map.values()) <= sideboard_size
+    assert optimizer.sideboard_feasible(data, result.sideboard_map)
+
+
+@pytest.mark.parametrize("tables, greedy_feasible", [
+    (lambda: random_tables(random.Random(1)), True),
+    (lambda: make_tables(40, 12, 7), False),
+])
+def test_exact_mode_reports_gap_to_greedy(tables, greedy_feasible):
+    data = build_snapshot(*tables())
+    sideboard_map, result = optimizer.optimize_sideboard(data, "exact")
+    assert sideboard_map == result.sideboard_map
+    assert result.greedy_feasible == greedy_feasible
+    if greedy_feasible:
+        assert result.greedy_objective <= result.objective + 1e-9
+        assert result.gap == pytest.approx((result.objective - result.greedy_objective) / result.objective)
+        assert result.gap >= 0
+    else:
+        # It can score above the optimum, which would make the gap negative
+        assert result.gap is None
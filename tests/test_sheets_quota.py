@@ -0,0 +1,153 @@
+import os
+import time
+
+import pytest
+from gspread.exceptions import APIError
+from requests import Response
+
+from sheets_client import SheetsClientManager
+from sheets_emulator import EmulatedClient, quota_error
+from sheets_quota import READ, WRITE, QuotaBudget, QuotaClient, QuotaExhausted, WriteBatch
+from storage import GoogleSheetsStorage, SheetsFetchError
+from synthetic import make_tables
+
+
+def emulated_sheets(**options):
+    # SheetsClientManager handing out an in-memory emulator of both spreadsheets
+    matchup_data_df, effectiveness_scores_df = make_tables(n_cards=10, n_decks=4)
+    emulator = EmulatedClient.from_tables({
+        "Matchup_Data_Cloud": matchup_data_df,
+        "Effectiveness_Scores_Cloud": effectiveness_scores_df,
+    }, **options)
+    sheets = SheetsClientManager()
+    sheets._client, sheets._pid = emulator, os.getpid()
+    return sheets, emulator
+
+
+def server_error():
+    response = Response()
+    response.status_code = 500
+    response._content = b'{"error": {"code": 500, "message": "Internal error", "status": "INTERNAL"}}'
+    return response
+
+
+def test_a_read_past_its_deadline_fails_instead_of_waiting():
+    budget = QuotaBudget(per_minute=10, write_reserve=0.2)
+    for _ in range(8):
+        budget.acquire(READ)
+
+    start = time.monotonic()
+    with pytest.raises(QuotaExhausted):
+        budget.acquire(READ, deadline=time.monotonic() + 5)
+    assert time.monotonic() - start < 1
+    assert budget.waited == 0
+    budget.acquire(WRITE, deadline=time.monotonic() + 5)  # The write reserve is still there
+
+
+def test_a_load_over_budget_gives_up_within_the_fetch_timeout():
+    sheets, emulator = emulated_sheets()
+    budget = QuotaBudget(per_minute=10)
+    storage = GoogleSheetsStorage(sheets, fetch_timeout=2, quota=QuotaClient(budget))
+    for _ in range(8):
+        budget.acquire(READ)
+
+    start = time.monotonic()
+    with pytest.raises(SheetsFetchError) as raised:
+        storage.load_tables()
+    assert time.monotonic() - start < 1
+    assert all(isinstance(error, QuotaExhausted) for error in raised.value.errors.values())
+    assert emulator.total_calls() == 0
+
+
+def test_reads_leave_the_write_reserve():
+    budget = QuotaBudget(per_minute=10, write_reserve=0.2)
+    for _ in range(8):
+        budget.acquire(READ)
+    budget.acquire(WRITE)
+    budget.acquire(WRITE)
+    assert budget.used() == 10
+    with pytest.raises(QuotaExhausted):
+        budget.acquire(WRITE, deadline=time.monotonic() + 1)
+
+
+def failing(times, error):
+    # fn that raises error on its first times calls, then returns "ok"
+    calls = []
+
+    def get_all_records():
+        calls.append(None)
+        if len(calls) <= times:
+            raise error
+        return "ok"
+    return get_all_records, calls
+
+
+def test_429s_are_retried_with_backoff():
+    quota = QuotaClient(QuotaBudget(per_minute=100), max_retries=3, base_delay=0.001)
+    fn, calls = failing(3, quota_error())
+    assert quota.call(fn) == "ok"
+    assert len(calls) == 4 and quota.retries == 3 and quota.budget.used() == 4
+
+    fn, calls = failing(4, quota_error())
+    with pytest.raises(APIError):
+        quota.call(fn)
+    assert len(calls) == 4
+
+
+def test_other_errors_and_late_retries_are_not_retried():
+    quota = QuotaClient(QuotaBudget(per_minute=100), base_delay=5)
+    fn, calls = failing(1, APIError(server_error()))
+    with pytest.raises(APIError):
+        quota.call(fn)
+    assert len(calls) == 1
+
+    # A read whose backoff would outlast its deadline gives up instead
+    fn, calls = failing(1, quota_error())
+    with pytest.raises(APIError):
+        quota.call(fn, priority=READ, deadline=time.monotonic() + 1e-6)
+    assert len(calls) == 1 and quota.retries == 0
+
+
+def test_worksheet_reads_get_its_priority_and_writes_the_reserve():
+    sheets, emulator = emulated_sheets()
+    budget = QuotaBudget(per_minute=10, write_reserve=0.2)
+    quota = QuotaClient(budget)
+    sheet = quota.worksheet(sheets.worksheet("Matchup_Data_Cloud"), priority=READ, deadline=time.monotonic() + 5)
+    for _ in range(8):
+        sheet.row_values(1)
+    with pytest.raises(QuotaExhausted):
+        sheet.get_all_records()
+    sheet.update_cell(2, 2, "0.5")  # A write, so it can use the reserve
+    assert emulator.calls["row_values"] == 8 and emulator.calls["update_cell"] == 1
+    assert emulator.calls["get_all_records"] == 0
+
+
+def test_write_batch_sends_one_call():
+    sheets, emulator = emulated_sheets()
+    sheet = QuotaClient().worksheet(sheets.worksheet("Effectiveness_Scores_Cloud"))
+    with WriteBatch(sheet) as batch:
+        batch.set(2, 2, 1)
+        batch.set(2, 3, 9)
+        batch.set(5, 4, "")
+    assert emulator.calls["batch_update"] == 1
+    rows = sheet.get_all_values()
+    assert rows[1][1:3] == ["1", "9"] and rows[4][3] == ""
+
+    with WriteBatch(sheet):
+        pass  # Nothing queued, nothing sent
+    with pytest.raises(RuntimeError):
+        with WriteBatch(sheet) as batch:
+            batch.set(2, 2, 4)
+            raise RuntimeError("form error")  # Not written
+    assert emulator.calls["batch_update"] == 1 and sheet.cell(2, 2).value == "1"
+
+
+def test_updating_a_card_is_one_write():
+    sheets, emulator = emulated_sheets()
+    storage = GoogleSheetsStorage(sheets, quota=QuotaClient(QuotaBudget(per_minute=100)))
+    storage.update_card("Card 3", max_copies=1, scores={"Deck 0": 10, "Deck 2": 0, "Nope": 5})
+    assert emulator.calls["batch_update"] == 1 and emulator.calls["update_cell"] == 0
+
+    _, effectiveness_scores_df = storage.load_tables()
+    card = effectiveness_scores_df.set_index("Card Name").loc["Card 3"]
+    assert (card["Max Copies"], card["Deck 0"], card["Deck 2"]) == (1, 10, 0)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from snapshot import build_snapshot
+from snapshot_store import SnapshotStore
+from storage import SQLiteStorage
+from synthetic import make_tables
+
+
+def synthetic_tables(tmp_path):
+    return make_tables(n_cards=30, n_decks=8, seed=3)
+
+
+def decks_without_cards(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "sideboard.db"))
+    with storage._connect() as conn:
+        conn.execute("INSERT INTO decks (name, times_fought, match_wins) VALUES ('Burn', 10, 5), ('Tron', 3, 1)")
+    return storage.load_tables()
+
+
+def empty_tables(tmp_path):
+    return SQLiteStorage(str(tmp_path / "sideboard.db")).load_tables()
+
+
+def arrays_of(snapshot):
+    matrix = snapshot.score_matrix
+    return {
+        "scores": matrix.scores, "max_copies": matrix.max_copies, "totals": matrix.totals,
+        "adjusted_playrate": snapshot.adjusted_playrate, "adjusted_winrate": snapshot.adjusted_winrate,
+        "max_slots": snapshot.max_slots,
+    }
+
+
+@pytest.mark.parametrize("tables", [synthetic_tables, decks_without_cards, empty_tables])
+def test_saved_snapshot_loads_back_the_same(tmp_path, tables):
+    matchup_data_df, effectiveness_scores_df = tables(tmp_path)
+    snapshot = build_snapshot(matchup_data_df, effectiveness_scores_df, queued_through=7)
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    assert store.save(snapshot)
+
+    loaded = SnapshotStore(str(tmp_path / "snapshots")).load(version=2)
+    assert loaded is not None
+    assert loaded.version == 2 and loaded.queued_through == 7
+    assert loaded.content_hash == snapshot.content_hash
+    assert loaded.score_matrix.card_names == snapshot.score_matrix.card_names
+    assert loaded.deck_names == snapshot.deck_names
+    assert loaded.total_games_played == snapshot.total_games_played
+    for name, array in arrays_of(loaded).items():
+        assert isinstance(array, np.memmap), name
+        assert array.dtype == arrays_of(snapshot)[name].dtype, name
+        np.testing.assert_array_equal(array, arrays_of(snapshot)[name])
+    pd.testing.assert_frame_equal(loaded.matchup_data_df, snapshot.matchup_data_df, check_dtype=False)
+    pd.testing.assert_frame_equal(loaded.effectiveness_scores_df, snapshot.effectiveness_scores_df,
+                                  check_dtype=False)
+
+
+def test_the_same_data_is_published_once(tmp_path):
+    matchup_data_df, effectiveness_scores_df = synthetic_tables(tmp_path)
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    assert store.save(build_snapshot(matchup_data_df, effectiveness_scores_df))
+    assert not store.save(build_snapshot(matchup_data_df, effectiveness_scores_df))
+    assert store.published()["serial"] == 1
@@ -0,0 +1,98 @@
+import pandas as pd
+import pytest
+
+from storage import MATCHUP_COLUMNS, AlreadyExists, NotFound, SQLiteStorage
+from synthetic import make_tables
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "sideboard.db"))
+    storage.add_deck("Burn", 0.1, 4, {})
+    storage.add_deck("Tron", 0.05, 3, {})
+    storage.add_card("Pyroblast", 4, {"Burn": 8, "Tron": 2})
+    storage.add_card("Stone Rain", 2, {"Tron": 9})
+    return storage
+
+
+def scores_of(storage):
+    _, effectiveness_scores_df = storage.load_tables()
+    return effectiveness_scores_df.set_index("Card Name").to_dict("index")
+
+
+def test_an_empty_database_loads_typed_tables(tmp_path):
+    matchup_data_df, effectiveness_scores_df = SQLiteStorage(str(tmp_path / "sideboard.db")).load_tables()
+    assert list(matchup_data_df.columns) == MATCHUP_COLUMNS and matchup_data_df.empty
+    assert [dtype.kind for dtype in matchup_data_df.dtypes.iloc[1:]] == ["f", "i", "i", "i"]
+    assert list(effectiveness_scores_df.columns) == ["Card Name", "Max Copies"] and effectiveness_scores_df.empty
+    assert effectiveness_scores_df["Max Copies"].dtype.kind == "i"
+
+
+def test_tables_come_back_in_sheet_order_and_shape(storage):
+    matchup_data_df, effectiveness_scores_df = storage.load_tables()
+    assert matchup_data_df.values.tolist() == [["Burn", 0.1, 4, 0, 0], ["Tron", 0.05, 3, 0, 0]]
+    assert list(effectiveness_scores_df.columns) == ["Card Name", "Max Copies", "Burn", "Tron"]
+    # A score that was never set is 0, like a blank cell after to_numeric
+    assert effectiveness_scores_df.values.tolist() == [["Pyroblast", 4, 8, 2], ["Stone Rain", 2, 0, 9]]
+
+
+def test_adding_a_deck_scores_the_existing_cards(storage):
+    storage.add_deck("Amulet", 0.02, 2, {"Stone Rain": 7, "Missing Card": 5})
+    assert scores_of(storage)["Stone Rain"] == {"Max Copies": 2, "Burn": 0, "Tron": 9, "Amulet": 7}
+    with pytest.raises(AlreadyExists):
+        storage.add_deck("Burn", 0.1, 4, {})
+    with pytest.raises(AlreadyExists):
+        storage.add_card("Pyroblast", 4, {})
+
+
+def test_updates_change_only_the_given_fields(storage):
+    storage.update_deck("Tron", 0.2, 5)
+    storage.update_card("Pyroblast", scores={"Tron": 6, "Nope": 1})
+    storage.update_card("Stone Rain", max_copies=3, scores={"Burn": 1})
+
+    matchup_data_df, _ = storage.load_tables()
+    assert matchup_data_df.values.tolist()[1] == ["Tron", 0.2, 5, 0, 0]
+    assert scores_of(storage) == {
+        "Pyroblast": {"Max Copies": 4, "Burn": 8, "Tron": 6},
+        "Stone Rain": {"Max Copies": 3, "Burn": 1, "Tron": 9},
+    }
+    with pytest.raises(NotFound):
+        storage.update_deck("Nope", 0.1, 1)
+    with pytest.raises(NotFound):
+        storage.update_card("Nope", max_copies=1)
+
+
+def test_removing_a_deck_drops_its_scores(storage):
+    storage.remove_deck("Burn")
+    storage.remove_card("Stone Rain")
+    matchup_data_df, effectiveness_scores_df = storage.load_tables()
+    assert matchup_data_df["Deck"].tolist() == ["Tron"]
+    assert effectiveness_scores_df.values.tolist() == [["Pyroblast", 4, 2]]
+    with storage._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0] == 1
+    with pytest.raises(NotFound):
+        storage.remove_deck("Burn")
+    with pytest.raises(NotFound):
+        storage.remove_card("Stone Rain")
+
+
+def test_recorded_matches_add_to_the_counters(storage):
+    storage.record_match("Burn", True)
+    storage.record_match("Burn", False)
+    assert storage.record_matches({"Tron": (3, 2), "Nope": (1, 1)}) == ["Nope"]
+    assert storage.match_counters() == {"Burn": (2, 1), "Tron": (3, 2)}
+    with pytest.raises(NotFound):
+        storage.record_match("Nope", True)
+
+
+def test_import_replaces_everything_with_the_given_tables(storage):
+    matchup_data_df, effectiveness_scores_df = make_tables(n_cards=20, n_decks=6, seed=4)
+    effectiveness_scores_df = effectiveness_scores_df.astype({"Deck 2": object})
+    effectiveness_scores_df.loc[3, "Deck 2"] = ""  # A blank cell in the sheet
+
+    storage.import_tables(matchup_data_df, effectiveness_scores_df)
+    loaded_matchups, loaded_scores = storage.load_tables()
+    pd.testing.assert_frame_equal(loaded_matchups, matchup_data_df, check_dtype=False)
+    expected = effectiveness_scores_df.copy()
+    expected.loc[3, "Deck 2"] = 0
+    pd.testing.assert_frame_equal(loaded_scores, expected.astype({"Deck 2": int}), check_dtype=False)